@@ -0,0 +1,134 @@
+import os
+import csv
+import sys
+import time
+import contextlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from utils import LocalOffer, LocalReply, OtherOffer, OtherReply
+
+# 批量处理：扫描目录下所有报盘/回盘文件，按 CPU 核数并行转换，输出一份汇总表
+
+# (类型, 报盘txt后缀, 回盘xls后缀, 输出文件名)
+OFFER_KINDS = [
+    ('本行报盘', '本行报盘.txt', None, '工行本行报盘.xls'),
+    ('他行报盘', '他行报盘.txt', None, '工行他行报盘.xls'),
+]
+REPLY_KINDS = [
+    ('本行回盘', '本行报盘.txt', '本行回盘.xls', '自来水本行回盘.txt'),
+    ('他行回盘', '他行报盘.txt', '他行回盘.xls', '自来水他行回盘'),
+]
+SUMMARY_NAME = '批量处理汇总.csv'
+SUMMARY_FIELDS = ['类型', '报盘文件', '回盘文件', '输出文件', '结果', '说明', '用时(秒)', '阶段耗时']
+
+
+class BatchTask:
+    def __init__(self, kind, txt_path, xls_path, out_path, error=None):
+        self.kind = kind
+        self.txt_path = txt_path
+        self.xls_path = xls_path
+        self.out_path = out_path
+        self.error = error  # 扫描时已知无法转换的原因，执行时直接记为失败
+
+
+def discover(folder, out_dir):
+    # 报盘 txt 各自生成一个报盘任务；回盘 xls 按文件名前缀与同目录的报盘 txt 配对
+    # 输出按前缀分子目录存放，文件名与单文件模式一致
+    # 同一前缀同时有 .xls 与 .xlsx 回盘时输出路径相同、也无从判断该用哪一份，只生成一个任务并记为失败
+    folder, out_dir = Path(folder), Path(out_dir)
+    tasks = []
+    for kind, txt_suffix, _, out_name in OFFER_KINDS:
+        for txt in sorted(folder.glob('*' + txt_suffix)):
+            prefix = txt.name[:-len(txt_suffix)] or '_'
+            tasks.append(BatchTask(kind, txt, None, out_dir / prefix / out_name))
+    for kind, txt_suffix, xls_suffix, out_name in REPLY_KINDS:
+        replies = {}  # 前缀 → 回盘 xls（.xls 在前）
+        for suffix in (xls_suffix, xls_suffix + 'x'):  # .xls 与 .xlsx
+            for xls in folder.glob('*' + suffix):
+                replies.setdefault(xls.name[:-len(suffix)], []).append(xls)
+        for prefix, found in sorted(replies.items()):
+            txt = folder / (prefix + txt_suffix)
+            error = None
+            if len(found) > 1:
+                error = f'同时存在 {found[0].name} 与 {found[1].name}，请只保留其中一份回盘'
+            tasks.append(BatchTask(kind, txt if txt.exists() else None, found[0],
+                                   out_dir / (prefix or '_') / out_name, error))
+    return tasks
+
+
+def run_task(task):
+    # 在子进程中执行单个任务，返回汇总表中的一行
+    row = {
+        '类型': task.kind,
+        '报盘文件': str(task.txt_path or ''),
+        '回盘文件': str(task.xls_path or ''),
+        '输出文件': '',
+        '结果': '成功',
+        '说明': '',
+        '阶段耗时': '',
+    }
+    start = time.perf_counter()
+    # 子进程里转换函数的提示信息写到标准错误，标准输出留给调用方（如命令行的 JSON 结果）
+    with contextlib.redirect_stdout(sys.stderr):
+        _run_task(task, row)
+    row['用时(秒)'] = f'{time.perf_counter() - start:.2f}'
+    return row
+
+
+def _run_task(task, row):
+    try:
+        if task.error is not None:
+            raise Exception(task.error)
+        if task.txt_path is None:
+            raise Exception('缺少对应的报盘txt')
+        task.out_path.parent.mkdir(parents=True, exist_ok=True)
+        if task.kind == '本行报盘':
+            result = LocalOffer(task.txt_path, task.out_path)
+        elif task.kind == '他行报盘':
+            result = OtherOffer(task.txt_path, task.out_path)
+        else:
+            reply = LocalReply if task.kind == '本行回盘' else OtherReply
+            result = reply(task.txt_path, task.xls_path, task.out_path)
+            if not result.ok:
+                row['结果'] = '不一致'
+                row['说明'] = f'{result.message}：{result.report}，明细见 {result.report.path}'
+        if result.validation is not None:
+            # 报盘已转换，字段校验发现的问题写在说明里
+            row['说明'] = f'字段校验发现问题：{result.validation}，明细见 {result.validation.path}'
+        row['阶段耗时'] = result.summary()
+        if row['结果'] == '成功':
+            row['输出文件'] = str(task.out_path)
+    except Exception as e:
+        row['结果'] = '失败'
+        row['说明'] = str(e)
+
+
+def run_batch(folder, out_dir=None, workers=None, progress=None):
+    # progress(已完成文件数, 已完成文件数, 文件总数)，与单文件作业的进度回调同一签名
+    out_dir = Path(out_dir) if out_dir else Path(folder) / '批量结果'
+    tasks = discover(folder, out_dir)
+    if not tasks:
+        raise Exception(f'目录中没有找到报盘/回盘文件：\n{folder}')
+
+    rows = [None] * len(tasks)
+    pool = ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(tasks)))
+    try:
+        futures = {pool.submit(run_task, task): i for i, task in enumerate(tasks)}
+        for done, future in enumerate(as_completed(futures), 1):
+            rows[futures[future]] = future.result()
+            if progress is not None:
+                progress(done, done, len(tasks))
+    except BaseException:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    summary_path = out_dir / SUMMARY_NAME
+    with open(summary_path, 'w', encoding='utf-8-sig', newline='') as f:  # 带 BOM，Excel 直接打开不乱码
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print('批量处理完成！', summary_path)
+    return summary_path, rows
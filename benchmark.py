@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import contextlib
+import datetime
+import platform
+import tempfile
+import statistics
+import subprocess
+import tracemalloc
+from pathlib import Path
+
+from excel import write_rows
+
+# 转换性能基准：生成合成的本行/他行报盘 txt（GBK，10 列，末尾汇总行）与对应的回盘 Excel，
+# 对 LocalOffer / OtherOffer / LocalReply / OtherReply 计时并测量峰值内存，结果可追加到 JSON-lines 文件跨提交比较，例如：
+#   python benchmark.py                                  # 10k、100k 行
+#   python benchmark.py -s 10000 100000 1000000 --record bench_results.jsonl
+#   python benchmark.py -s 100000 -f LocalReply OtherReply -n 5
+#   python benchmark.py -s 1000000 -f LocalOffer OtherOffer -j 8   # 报盘多进程分块解析
+#   python benchmark.py -f LocalOffer OtherOffer --engine numpy     # 报盘向量化解析
+# 合成数据按行数缓存在 --data 目录，重复运行不再生成。
+# 峰值内存用 tracemalloc 统计 Python 分配（另跑一遍，不影响计时）；内存映射的文件不计入
+# 回盘解析缓存默认关闭，每次都计入 Excel 解析；加 --cache 测命中缓存时的耗时
+# 报盘索引（报盘时写在合成 txt 旁边的 <报盘txt>.keys）默认在每次回盘前删除，每次都计入 txt 扫描；加 --index 测命中索引时的耗时
+# 处理历史库默认关闭；加 --history 时写入 --data 目录下单独的历史库，不影响日常使用的历史库
+
+HERE = Path(__file__).resolve().parent
+SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_SIZES = (10_000, 100_000)
+FUNCS = ('LocalOffer', 'OtherOffer', 'LocalReply', 'OtherReply')
+
+LOCAL_TXT = '自来水本行报盘.txt'
+OTHER_TXT = '自来水他行报盘.txt'
+XLS_ROW_LIMIT = 65535  # 超过 .xls 单表行数的回盘改用 .xlsx，回盘只读第一个工作表
+
+SURNAMES = '王李张刘陈杨赵黄周吴徐孙胡朱高林何郭马罗'
+GIVEN = '伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英'
+COMPANIES = ('天津滨海 物流有限公司', '津南区 商贸 有限公司', 'Tianjin Water Trading Co', '和平区 餐饮管理中心')
+
+
+# -------------------- 合成数据 --------------------
+def _name(rnd, i):
+    # 约 5% 为含空格的多词公司名（本行报盘的正则支持；回盘核对按 10 列切分时跳过这些行）
+    if i % 20 == 7:
+        return rnd.choice(COMPANIES)
+    return rnd.choice(SURNAMES) + ''.join(rnd.choice(GIVEN) for _ in range(rnd.randint(1, 2)))
+
+
+def _flag(rnd):
+    return '全部成功' if rnd.random() < 0.9 else rnd.choice(('失败', '部分成功'))
+
+
+def generate(folder, rows, seed=20240101):
+    # 生成一套合成数据：两个报盘 txt + 两个回盘 Excel，返回各文件路径
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    rnd = random.Random(seed)
+    ext = '.xls' if rows <= XLS_ROW_LIMIT else '.xlsx'
+    paths = {
+        'local_txt': folder / LOCAL_TXT,
+        'other_txt': folder / OTHER_TXT,
+        'local_xls': folder / ('自来水本行回盘' + ext),
+        'other_xls': folder / ('自来水他行回盘' + ext),
+    }
+
+    # 本行报盘：前缀 序号 固定码 卡号 姓名 固定值 金额(分) 中间码 4位备注 备注
+    local_reply = []
+    with open(paths['local_txt'], 'w', encoding='gbk', newline='') as f:
+        total = 0
+        for i in range(rows):
+            card = f'6222{rnd.randrange(10 ** 15):015d}'
+            name = _name(rnd, i)
+            cents = rnd.randint(1, 99_999_999)
+            remark = f'{rnd.randrange(10000):04d}'
+            total += cents
+            f.write(f'JZ00201   {i + 1}   A1234567890123   {card}   {name}   1   {cents}   000   '
+                    f'{remark}   X{i}\r\n')
+            if ' ' not in name:
+                local_reply.append([name, card, cents / 100, remark, '', _flag(rnd)])
+        f.write(f'汇总   {rows}   笔   {total}   天津泰达津联自来水有限公司\r\n')
+    write_rows(paths['local_xls'], 'sheet1',
+               ['姓名', '卡号', '金额', '备注', '实处理金额', '处理标志'], local_reply)
+    del local_reply
+
+    # 他行报盘：业务种类 序号 跨行行号 卡号 姓名 行别 金额(分) 协议书号 4位备注 备注
+    other_reply = []
+    with open(paths['other_txt'], 'w', encoding='gbk', newline='') as f:
+        total = 0
+        for i in range(rows):
+            card = f'6217{rnd.randrange(10 ** 15):015d}'
+            name = _name(rnd, i)
+            bank_type = rnd.choice('12')
+            cents = rnd.randint(1, 99_999_999)
+            agreement = f'AG{i:08d}'
+            remark = f'{rnd.randrange(10000):04d}'
+            total += cents
+            f.write(f'SSS00201  {i + 1}  BK102100099996  {card}  {name}  {bank_type}  {cents}  '
+                    f'{agreement}  {remark}  Y\r\n')
+            if ' ' not in name:
+                other_reply.append([name, card, bank_type, '', '', agreement, '', cents / 100,
+                                    remark, '', _flag(rnd)])
+        f.write(f'天津泰达津联自来水有限公司  合计  {rows}  笔  {total}\r\n')
+    write_rows(paths['other_xls'], 'sheet1',
+               ['姓名', '卡号', '行别', '跨行行号', '业务种类', '协议书号', '账号地址',
+                '应处理金额', '备注', '实处理金额', '处理标志'], other_reply)
+    return paths
+
+
+def dataset(data_dir, rows):
+    # 按行数缓存合成数据；已生成（以标记文件为准）则直接复用
+    folder = Path(data_dir) / str(rows)
+    marker = folder / 'paths.json'
+    if marker.exists():
+        return {k: Path(v) for k, v in json.loads(marker.read_text(encoding='utf-8')).items()}
+    print(f'生成 {rows} 行合成数据 → {folder}', file=sys.stderr)
+    paths = generate(folder, rows)
+    marker.write_text(json.dumps({k: str(v) for k, v in paths.items()}), encoding='utf-8')
+    return paths
+
+
+# -------------------- 计时与内存 --------------------
+def _job(func_name, paths, out_dir, jobs=1, engine='scalar', index=False):
+    import utils
+    func = getattr(utils, func_name)
+    if func_name == 'LocalOffer':
+        return lambda: func(paths['local_txt'], out_dir / '本行报盘.xlsx', workers=jobs, engine=engine)
+    if func_name == 'OtherOffer':
+        return lambda: func(paths['other_txt'], out_dir / '他行报盘.xlsx', workers=jobs, engine=engine)
+    if func_name == 'LocalReply':
+        txt, xls, out = paths['local_txt'], paths['local_xls'], out_dir / '本行回盘.txt'
+    else:
+        txt, xls, out = paths['other_txt'], paths['other_xls'], out_dir / '他行回盘.txt'
+
+    def run():
+        # 同一次运行中前面的报盘会在合成 txt 旁写下索引，不删除时回盘计时的就是命中索引的耗时
+        if not index:
+            utils.index_path(txt).unlink(missing_ok=True)
+        return _check_reply(func(txt, xls, out))
+    return run
+
+
+def _check_reply(result):
+    # 合成的回盘与报盘一一对应，不一致说明核对逻辑或生成器出了问题，计时没有意义
+    if not result.ok:
+        raise RuntimeError(f'合成数据核对不一致：{result.report}')
+    return result
+
+
+def measure(run, repeat):
+    # 先计时 repeat 次，再单独跑一次统计峰值内存（tracemalloc 会拖慢执行，不与计时混在一起）
+    # 返回各次耗时、峰值内存与最后一次计时的阶段耗时
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times, peak, result.stages
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def _previous(record_path):
+    # 记录文件中每个 (函数, 行数) 的最近一次结果，用于对比
+    previous = {}
+    if record_path and os.path.exists(record_path):
+        with open(record_path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    r = json.loads(line)
+                    previous[(r['func'], r['rows'])] = r
+    return previous
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='报盘/回盘转换性能基准')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help=f'数据行数（默认 {" ".join(map(str, DEFAULT_SIZES))}；完整档位 {" ".join(map(str, SIZES))}）')
+    parser.add_argument('-f', '--funcs', nargs='+', choices=FUNCS, default=FUNCS, help='要测的转换函数')
+    parser.add_argument('-n', '--repeat', type=int, default=3, help='每项计时次数（默认 3）')
+    parser.add_argument('--data', default=os.path.join(tempfile.gettempdir(), 'jzb_benchmark'),
+                        help='合成数据缓存目录')
+    parser.add_argument('--label', default='', help='本次测量的备注，如机器或配置名称')
+    parser.add_argument('--record', help='追加结果到 JSON-lines 文件，并与其中最近一次结果对比')
+    parser.add_argument('--cache', action='store_true', help='使用回盘解析缓存（默认关闭）')
+    parser.add_argument('--history', action='store_true', help='写入处理历史库（默认关闭）')
+    parser.add_argument('--index', action='store_true', help='回盘使用报盘时写下的索引（默认每次删除后重新扫描 txt）')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='报盘并行解析的进程数（默认 1）')
+    parser.add_argument('--engine', choices=('scalar', 'numpy'), default='scalar',
+                        help='报盘解析方式（默认 scalar；numpy 需要安装 numpy）')
+    args = parser.parse_args(argv)
+    if not args.cache:
+        os.environ['JZB_CACHE_DIR'] = 'off'
+    os.environ['JZB_HISTORY_DB'] = os.path.join(args.data, 'history.sqlite3') if args.history else 'off'
+
+    previous = _previous(args.record)
+    results = []
+    for rows in args.sizes:
+        paths = dataset(args.data, rows)
+        for func_name in args.funcs:
+            # 转换函数的提示信息不输出，只保留基准结果
+            with tempfile.TemporaryDirectory() as tmp, open(os.devnull, 'w') as devnull, \
+                    contextlib.redirect_stdout(devnull):
+                run = _job(func_name, paths, Path(tmp), args.jobs, args.engine, args.index)
+                times, peak, stages = measure(run, args.repeat)
+            result = {
+                'time': datetime.datetime.now().isoformat(timespec='seconds'),
+                'commit': git_commit(),
+                'label': args.label,
+                'cache': args.cache,
+                'history': args.history,
+                'index': args.index,
+                'jobs': args.jobs,
+                'engine': args.engine,
+                'python': platform.python_version(),
+                'func': func_name,
+                'rows': rows,
+                'repeat': args.repeat,
+                'median': round(statistics.median(times), 4),
+                'min': round(min(times), 4),
+                'peak_mb': round(peak / 2 ** 20, 1),
+                'stages': {name: round(sec, 4) for name, sec in stages.items()},  # 最后一次计时的阶段耗时
+            }
+            results.append(result)
+            line = (f'{func_name:<11}{rows:>9} 行  中位数 {result["median"]:.3f}s  '
+                    f'最小 {result["min"]:.3f}s  峰值内存 {result["peak_mb"]:.1f} MB')
+            last = previous.get((func_name, rows))
+            if last:
+                line += f'  （上次 {last["commit"] or "-"}：{last["median"]:.3f}s，{last["peak_mb"]:.1f} MB）'
+            print(line)
+
+    if args.record:
+        with open(args.record, 'a', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
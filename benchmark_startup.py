@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import datetime
+import statistics
+import subprocess
+from pathlib import Path
+
+# 冷启动计时：反复启动 GUI（源码或打包后的 exe），测量
+#   first_window     —— 启动到首个窗口绘制完成
+#   first_conversion —— 启动到首次本行报盘转换完成（指定 --txt 时）
+# 程序内的打点见 main._startup_bench。打包配置（main.spec）以此为准进行调整，例如：
+#   python benchmark_startup.py --label source
+#   python benchmark_startup.py --exe dist/main/main.exe --label onedir-noupx --txt 样例本行报盘.txt --record startup_results.jsonl
+
+HERE = Path(__file__).resolve().parent
+
+
+def run_once(cmd, txt, timeout):
+    with tempfile.TemporaryDirectory() as tmp:
+        marker = os.path.join(tmp, 'marker.txt')
+        env = dict(os.environ, JZB_STARTUP_BENCH=marker)
+        if txt:
+            env['JZB_STARTUP_BENCH_TXT'] = os.path.abspath(txt)
+        start = time.time()
+        subprocess.run(cmd, env=env, timeout=timeout, check=True)
+        events = {}
+        with open(marker, encoding='utf-8') as f:
+            for line in f:
+                name, stamp = line.split()
+                events[name] = float(stamp) - start
+        return events
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='GUI 冷启动计时')
+    parser.add_argument('--exe', help='打包后的可执行文件（默认用当前解释器运行 main.py）')
+    parser.add_argument('--txt', help='本行报盘txt，指定后同时测量首次转换耗时')
+    parser.add_argument('-n', '--runs', type=int, default=5, help='启动次数（默认 5）')
+    parser.add_argument('--label', default='', help='本次测量的配置名称，如 onefile-upx / onedir-noupx')
+    parser.add_argument('--timeout', type=float, default=120, help='单次启动超时秒数')
+    parser.add_argument('--record', help='追加结果到 JSON-lines 文件，便于跨提交/配置比较')
+    args = parser.parse_args(argv)
+
+    cmd = [args.exe] if args.exe else [sys.executable, str(HERE / 'main.py')]
+    runs = [run_once(cmd, args.txt, args.timeout) for _ in range(args.runs)]
+
+    result = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'label': args.label,
+        'cmd': cmd,
+        'runs': args.runs,
+    }
+    for event in ('first_window', 'first_conversion'):
+        values = [r[event] for r in runs if event in r]
+        if values:
+            result[event] = {'median': round(statistics.median(values), 3),
+                             'min': round(min(values), 3),
+                             'max': round(max(values), 3)}
+            print(f'{event:<17} 中位数 {statistics.median(values):.3f}s  '
+                  f'最小 {min(values):.3f}s  最大 {max(values):.3f}s')
+
+    if args.record:
+        with open(args.record, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
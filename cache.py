@@ -0,0 +1,117 @@
+import os
+import hashlib
+import marshal
+from pathlib import Path
+
+# 回盘解析结果的磁盘缓存：同一份回盘 Excel（按内容哈希判断）再次核对时直接读缓存，跳过 Excel 解析
+#   先用 路径+大小+修改时间 查到内容哈希（不读文件），查不到再计算哈希；
+#   缓存项按内容哈希与解析方式命名，总大小超过上限时按最近使用时间淘汰
+# 缓存目录默认 %LOCALAPPDATA%\jinzhoubank\cache（其他系统 ~/.cache/jinzhoubank），
+# 可用环境变量 JZB_CACHE_DIR 指定，设为 off 则不使用缓存。缓存读写出错一律当作未命中，不影响转换
+
+CACHE_ENV = 'JZB_CACHE_DIR'
+CACHE_MAX_BYTES = 256 * 2 ** 20  # 缓存目录总大小上限
+CACHE_VERSION = 1                # 缓存内容的结构变化时加一，旧缓存自然失效
+HASH_CHUNK = 1 << 20
+
+
+def app_path(env, name):
+    # 本程序在用户目录下的文件/目录：环境变量 env 指定的路径，设为 off（或空）时返回 None；
+    # 未设置时为 %LOCALAPPDATA%\jinzhoubank\<name>（其他系统 ~/.cache/jinzhoubank/<name>）
+    configured = os.environ.get(env)
+    if configured is not None:
+        return None if configured.strip().lower() in ('', 'off') else Path(configured)
+    base = os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return Path(base) / 'jinzhoubank' / name
+
+
+def cache_dir():
+    return app_path(CACHE_ENV, 'cache')
+
+
+def _stat_key(path):
+    st = os.stat(path)
+    ident = f'{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}'
+    return hashlib.blake2b(ident.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _content_digest(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_digest(folder, path):
+    # 路径+大小+修改时间未变时直接取记下的内容哈希，否则重新计算并记下
+    stat_file = folder / f's-{_stat_key(path)}'
+    try:
+        digest = stat_file.read_text(encoding='ascii')
+        os.utime(stat_file)
+        return digest
+    except OSError:
+        pass
+    digest = _content_digest(path)
+    _write_atomic(stat_file, digest.encode('ascii'))
+    return digest
+
+
+def _entry(folder, digest, kind):
+    return folder / f'h-{digest}-{kind}-v{CACHE_VERSION}'
+
+
+def _write_atomic(target, data):
+    tmp = target.with_name(f'{target.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, target)
+
+
+def load(excel_path, kind):
+    # 命中返回缓存的对象，未命中或缓存不可用返回 None
+    folder = cache_dir()
+    if folder is None:
+        return None
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        entry = _entry(folder, _file_digest(folder, excel_path), kind)
+        with open(entry, 'rb') as f:
+            value = marshal.loads(f.read())  # 整块读入再解析，比 marshal.load(f) 逐段读快得多
+        os.utime(entry)  # 记录最近使用时间，供淘汰时参考
+        return value
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def store(excel_path, kind, value):
+    # value 只能包含 marshal 支持的内置类型（str/int/bytes/tuple/list/dict/set）
+    folder = cache_dir()
+    if folder is None:
+        return
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+        _write_atomic(_entry(folder, _file_digest(folder, excel_path), kind), marshal.dumps(value))
+        evict(folder)
+    except (OSError, ValueError):
+        pass
+
+
+def evict(folder, limit=CACHE_MAX_BYTES):
+    # 总大小超过上限时，从最久未使用的缓存项开始删除
+    entries = []
+    for entry in folder.iterdir():
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda e: e[0]):
+        if total <= limit:
+            break
+        try:
+            entry.unlink()
+            total -= size
+        except OSError:
+            pass
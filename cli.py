@@ -0,0 +1,160 @@
+import os
+import sys
+import json
+import argparse
+import contextlib
+
+from metrics import LOG_ENV
+
+# 命令行入口：python -m cli <命令> ...，不导入 tkinter，可在服务器上由计划任务调用
+# 结果以 JSON 输出到标准输出，转换函数自身的提示信息改写到标准错误
+
+EXIT_OK = 0
+EXIT_MISMATCH = 1  # 报盘txt与回盘xls信息不一致
+EXIT_USAGE = 2     # 参数错误（argparse 默认）
+EXIT_ERROR = 3     # 处理失败
+EXIT_INVALID = 4   # 报盘已转换，但字段校验发现问题（不符合银行限制）
+
+
+def _stats(result):
+    # 各阶段耗时与计数，附在每个转换命令的输出里
+    info = result.to_dict()
+    return {k: info[k] for k in ('elapsed', 'stages', 'counters', 'skipped')}
+
+
+def _offer(args):
+    from utils import LocalOffer, OtherOffer
+    if args.engine == 'numpy':
+        import vectorized
+        if not vectorized.available():
+            raise Exception('未安装 numpy，无法使用 --engine numpy')
+    func = LocalOffer if args.command == 'local-offer' else OtherOffer
+    result = func(args.txt, args.output, workers=args.jobs, engine=args.engine)
+    if result.validation is None:
+        return EXIT_OK, {'status': 'ok', 'message': result.message, 'output': args.output,
+                         'stats': _stats(result)}
+    return EXIT_INVALID, {
+        'status': 'invalid',
+        'message': result.message,
+        'output': args.output,
+        'validation': str(result.validation.path),  # 字段校验问题明细 CSV
+        'counts': result.validation.counts,         # 各类问题条数
+        'stats': _stats(result),
+    }
+
+
+def _reply(args):
+    from utils import LocalReply, OtherReply
+    func = LocalReply if args.command == 'local-reply' else OtherReply
+    result = func(args.txt, args.xls, args.output)
+    if result.ok:
+        return EXIT_OK, {'status': 'ok', 'message': result.message, 'output': args.output,
+                         'stats': _stats(result)}
+    return EXIT_MISMATCH, {
+        'status': 'mismatch',
+        'message': result.message,
+        'report': str(result.report.path),  # 差异明细 CSV
+        'counts': result.report.counts,     # 各类差异条数
+        'stats': _stats(result),
+    }
+
+
+def _batch(args):
+    from batch import run_batch
+    summary_path, rows = run_batch(args.folder, args.output, args.workers)
+    results = {r['结果'] for r in rows}
+    code = EXIT_ERROR if '失败' in results else EXIT_MISMATCH if '不一致' in results else EXIT_OK
+    return code, {'status': {EXIT_OK: 'ok', EXIT_MISMATCH: 'mismatch', EXIT_ERROR: 'error'}[code],
+                  'summary': str(summary_path), 'results': rows}
+
+
+def _watch(args):
+    from watch import Watcher
+    watcher = Watcher(args.inbox, args.output, args.workers, args.interval, args.settle,
+                      on_result=lambda row: print(json.dumps(row, ensure_ascii=False), file=args.stdout, flush=True))
+    processed = watcher.run()
+    return EXIT_OK, {'status': 'ok', 'processed': processed, 'outbox': str(watcher.outbox)}
+
+
+def _history(args):
+    import history
+    from money import format_cents
+    if not (args.card or args.name or args.agreement or args.since or args.until):
+        raise Exception('请至少指定卡号、姓名、协议书号或日期范围之一')
+    records = history.query(args.card, args.name, args.agreement, args.since, args.until, args.limit, args.db)
+    for record in records:
+        if isinstance(record['amount_cents'], int):
+            record['amount'] = format_cents(record['amount_cents'])
+        record['ok'] = bool(record['ok'])
+    return EXIT_OK, {'status': 'ok', 'count': len(records), 'records': records}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m cli', description='报盘/回盘文件转换（命令行版）')
+    parser.add_argument('--metrics-log', help='每次转换的阶段耗时与计数追加到此 JSON-lines 文件')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name, desc in (('local-offer', '本行报盘：报盘TXT → 报盘Excel'),
+                       ('other-offer', '他行报盘：报盘TXT → 报盘Excel')):
+        p = sub.add_parser(name, help=desc)
+        p.add_argument('txt', help='报盘TXT')
+        p.add_argument('output', help='输出的报盘Excel（.xlsx 流式写出；.xls 超过 65535 行自动分表）')
+        p.add_argument('-j', '--jobs', type=int, default=1,
+                       help='并行解析的进程数（默认 1；大于 1 时 16MB 以上的文件分块并行解析）')
+        p.add_argument('--engine', choices=('scalar', 'numpy'), default='scalar',
+                       help='解析方式：scalar 逐行（默认）；numpy 按块向量化解析（需要安装 numpy）')
+        p.set_defaults(handler=_offer)
+
+    for name, desc in (('local-reply', '本行回盘：报盘TXT + 回盘Excel → 回盘TXT'),
+                       ('other-reply', '他行回盘：报盘TXT + 回盘Excel → 回盘TXT')):
+        p = sub.add_parser(name, help=desc)
+        p.add_argument('txt', help='报盘TXT')
+        p.add_argument('xls', help='回盘Excel(.xls/.xlsx)')
+        p.add_argument('output', help='输出的回盘TXT')
+        p.set_defaults(handler=_reply)
+
+    p = sub.add_parser('batch', help='批量处理文件夹内全部报盘/回盘')
+    p.add_argument('folder', help='输入文件夹')
+    p.add_argument('-o', '--output', help='输出文件夹（默认为 <输入文件夹>/批量结果）')
+    p.add_argument('-w', '--workers', type=int, help='并行进程数（默认为 CPU 核数）')
+    p.set_defaults(handler=_batch)
+
+    p = sub.add_parser('watch', help='监控收件文件夹，新到的报盘/回盘文件写完后自动转换（Ctrl+C 停止）')
+    p.add_argument('inbox', help='收件文件夹')
+    p.add_argument('-o', '--output', help='发件文件夹（默认为 <收件文件夹>/监控结果）')
+    p.add_argument('-w', '--workers', type=int, help='同时转换的文件数上限（默认为 CPU 核数）')
+    p.add_argument('--interval', type=float, default=1.0, help='扫描间隔秒数（默认 1）')
+    p.add_argument('--settle', type=float, default=2.0, help='文件多少秒没有变化视为写完（默认 2）')
+    p.set_defaults(handler=_watch)
+
+    p = sub.add_parser('history', help='查询处理历史库：按卡号/姓名/协议书号与批次日期查找历次报盘、回盘记录')
+    p.add_argument('--card', help='卡号')
+    p.add_argument('--name', help='姓名/公司名（精确匹配）')
+    p.add_argument('--agreement', help='协议书号')
+    p.add_argument('--since', help='起始批次日期（含），如 2024-01-01')
+    p.add_argument('--until', help='截止批次日期（含）')
+    p.add_argument('--limit', type=int, default=100, help='最多返回的记录数（默认 100，最近的批次在前）')
+    p.add_argument('--db', help='历史库文件（默认为环境变量 JZB_HISTORY_DB 或用户目录下的 history.sqlite3）')
+    p.set_defaults(handler=_history)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics_log:
+        # 通过环境变量传给转换函数，批量处理的子进程也会继承
+        os.environ[LOG_ENV] = os.path.abspath(args.metrics_log)
+    # 转换函数的提示信息改写到标准错误；监控模式逐条输出的结果仍写到真正的标准输出
+    args.stdout = sys.stdout
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            code, result = args.handler(args)
+    except Exception as e:
+        code, result = EXIT_ERROR, {'status': 'error', 'message': str(e)}
+    json.dump(result, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write('\n')
+    return code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+import contextlib
+import tkinter as tk
+from tkinter import ttk
+
+# 回盘核对差异浏览窗口：差异明细按需从报告 CSV 读入，表格每次只渲染一页，
+# 差异再多打开也是即时的；可按姓名或卡号搜索
+# 内存中只记各页起点与搜索命中的字节偏移，每次读完即关闭报告，窗口开着时不占用报告文件
+
+PAGE_SIZE = 200  # 每页显示的差异条数
+
+
+class DiffViewer(tk.Toplevel):
+    def __init__(self, master, report, title='差异明细'):
+        super().__init__(master)
+        self.title(f'{title}（{report.path.name}）')
+        self.geometry('900x520')
+        self.minsize(640, 360)
+
+        self.report = report
+        self._page_starts = []  # 已经过的各页第一条差异在报告中的偏移
+        self._matches = None    # 搜索命中的差异在报告中的偏移；None 表示不过滤
+        self.page = 0
+
+        # 顶部：汇总 + 搜索
+        top = tk.Frame(self)
+        top.pack(fill='x', padx=10, pady=(10, 6))
+        tk.Label(top, text=str(report), font=('Microsoft YaHei', 10), anchor='w').pack(side='left')
+        self.query = tk.StringVar()
+        tk.Button(top, text='清除', width=6, command=self.clear_search).pack(side='right')
+        tk.Button(top, text='搜索', width=6, command=self.search).pack(side='right', padx=(6, 6))
+        entry = tk.Entry(top, textvariable=self.query, width=28, font=('Microsoft YaHei', 10))
+        entry.pack(side='right')
+        entry.bind('<Return>', lambda e: self.search())
+        tk.Label(top, text='姓名/卡号：', font=('Microsoft YaHei', 10)).pack(side='right')
+
+        # 表格：固定一页的行数，翻页时整页替换
+        table = tk.Frame(self)
+        table.pack(fill='both', expand=True, padx=10)
+        self.tree = ttk.Treeview(table, columns=report.fields, show='headings')
+        for field in report.fields:
+            self.tree.heading(field, text=field)
+            self.tree.column(field, width=90 if '笔数' in field else 140, stretch=True)
+        scroll = ttk.Scrollbar(table, orient='vertical', command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side='left', fill='both', expand=True)
+        scroll.pack(side='left', fill='y')
+
+        # 底部：翻页
+        bottom = tk.Frame(self)
+        bottom.pack(fill='x', padx=10, pady=(6, 10))
+        for text, command in (('首页', lambda: self.goto(0)),
+                              ('上一页', lambda: self.goto(self.page - 1)),
+                              ('下一页', lambda: self.goto(self.page + 1)),
+                              ('末页', lambda: self.goto(self.page_count() - 1))):
+            tk.Button(bottom, text=text, width=8, command=command).pack(side='left', padx=(0, 6))
+        self.page_label = tk.Label(bottom, text='', font=('Microsoft YaHei', 9), anchor='w')
+        self.page_label.pack(side='left', padx=(10, 0))
+
+        self.goto(0)
+
+    def _page_rows(self, page):
+        # 读出第 page 页：从已知的最近一页起点往后读，顺带记下经过的各页起点
+        known = min(page, len(self._page_starts) - 1)
+        index = max(known, 0) * PAGE_SIZE  # 下一条差异的序号
+        rows = []
+        with contextlib.closing(self.report.iter_rows(self._page_starts[known] if known >= 0 else None)) as source:
+            for offset, row in source:
+                if index == len(self._page_starts) * PAGE_SIZE:
+                    self._page_starts.append(offset)
+                if index // PAGE_SIZE == page:
+                    rows.append(row)
+                    if len(rows) == PAGE_SIZE:
+                        break
+                index += 1
+        return rows
+
+    def row_count(self):
+        return self.report.total if self._matches is None else len(self._matches)
+
+    def page_count(self):
+        return max(1, -(-self.row_count() // PAGE_SIZE))
+
+    def goto(self, page):
+        page = min(max(page, 0), self.page_count() - 1)
+        self.page = page
+        start, stop = page * PAGE_SIZE, min((page + 1) * PAGE_SIZE, self.row_count())
+        if self._matches is None:
+            rows = self._page_rows(page)
+        else:
+            rows = self.report.rows_at(self._matches[start:stop])
+
+        self.tree.delete(*self.tree.get_children())
+        for row in rows:
+            self.tree.insert('', 'end', values=row)
+        self.tree.yview_moveto(0)
+        self.page_label.config(
+            text=f'第 {page + 1}/{self.page_count()} 页，共 {self.row_count()} 条'
+                 + ('' if self._matches is None else f'（搜索：{self.query.get().strip()}）'))
+
+    def search(self):
+        # 姓名、卡号为报告中第 2、3 列；子串匹配，边读边比较，只留下命中的偏移
+        text = self.query.get().strip()
+        if not text:
+            self.clear_search()
+            return
+        with contextlib.closing(self.report.iter_rows()) as rows:
+            self._matches = [offset for offset, row in rows if text in row[1] or text in row[2]]
+        self.goto(0)
+
+    def clear_search(self):
+        self.query.set('')
+        self._matches = None
+        self.goto(0)
@@ -0,0 +1,69 @@
+import os
+import codecs
+import functools
+
+# 报盘 txt 的编码侦测：BOM → 纯 ASCII 快速路径 → 有界前缀内 UTF-8/GBK 增量校验
+# 文件开头是纯 ASCII 时（如很长的英文、数字行）跳过这一段，从第一块含非 ASCII 字节的内容起侦测
+# 结果按 (路径, 大小, 修改时间) 缓存，同一文件在多次作业之间只侦测一次
+
+DEFAULT_ENCODING = 'gbk'
+SCAN_LIMIT = 64 * 1024  # 最多检查的前缀字节数
+CHUNK_SIZE = 8 * 1024   # 增量校验的分块大小
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# 候选编码按优先级排列：合法的 GBK 文本极少同时是合法的 UTF-8，因此 UTF-8 在前
+CANDIDATES = ('utf-8', 'gbk')
+
+
+def detect_bytes(raw, default=DEFAULT_ENCODING):
+    # ①. BOM
+    for bom, enc in BOMS:
+        if raw.startswith(bom):
+            return enc
+
+    # ②. 纯 ASCII：GBK/UTF-8 的公共子集，直接按默认编码处理
+    if raw.isascii():
+        return default
+
+    # ③. 分块增量解码，候选编码一旦出错即淘汰，只剩一个时提前结束
+    decoders = {enc: codecs.getincrementaldecoder(enc)() for enc in CANDIDATES}
+    for pos in range(0, len(raw), CHUNK_SIZE):
+        chunk = raw[pos:pos + CHUNK_SIZE]
+        for enc in list(decoders):
+            try:
+                # final=False：前缀末尾被截断的多字节字符不算错误
+                decoders[enc].decode(chunk, final=False)
+            except UnicodeDecodeError:
+                del decoders[enc]
+        if len(decoders) <= 1:
+            break
+
+    for enc in CANDIDATES:
+        if enc in decoders:
+            return enc
+    return default
+
+
+@functools.lru_cache(maxsize=256)
+def _detect_file(path, size, mtime_ns, default):
+    with open(path, 'rb') as f:
+        raw = f.read(SCAN_LIMIT)
+        # 各块都从 ASCII 字符之后开始，不会切开多字节字符；整个文件都是 ASCII 时读到空块，按默认编码
+        while raw and raw.isascii():
+            raw = f.read(SCAN_LIMIT)
+    return detect_bytes(raw, default)
+
+
+def detect_encoding(path, default=DEFAULT_ENCODING):
+    st = os.stat(path)
+    return _detect_file(os.path.abspath(path), st.st_size, st.st_mtime_ns, default)
+
+
+def fragment_codec(enc):
+    # 编码文件中间的片段（字段、子串）用的编码：utf-8-sig 编码时会在开头加 BOM，片段应按 utf-8 编码
+    return 'utf-8' if codecs.lookup(enc).name == 'utf-8-sig' else enc
@@ -0,0 +1,436 @@
+import os
+import re
+import mmap
+import struct
+import zipfile
+import posixpath
+from xml.sax.saxutils import escape
+from xml.etree.ElementTree import iterparse
+
+# Excel 写出：按扩展名选择格式
+#   .xlsx —— 直接按行生成工作表 XML 并流式压缩进 zip，逐批落盘，内存占用不随行数增长
+#   .xls  —— xlwt（银行模板仍要求 .xls 时），超过单表行数上限自动分到后续工作表
+# 文本单元格按文本格式（@）写入，与银行模板一致；int/float 按数值写入（如生成测试用的回盘）
+#
+# Excel 读入（回盘）：只取需要的列，按行流式产出，取值类型与 xlrd 一致（数字为 float，文本为 str）
+#   .xls  —— 内存映射 + xlrd 按需打开，直接扫描第一个工作表的单元格记录，只解码需要的列
+#   .xlsx —— 直接流式解析第一个工作表的 XML，不加载整个工作簿
+
+XLS_MAX_ROWS = 65536      # .xls 单个工作表行数上限（含表头）
+XLSX_MAX_ROWS = 1048576   # .xlsx 单个工作表行数上限（含表头）
+
+
+def is_xlsx(path):
+    return str(path).lower().endswith('.xlsx')
+
+
+def _sheet_names(sheet_name):
+    # 第一个工作表沿用原名，之后依次为 名称_2、名称_3 ...
+    yield sheet_name
+    n = 2
+    while True:
+        yield f'{sheet_name}_{n}'
+        n += 1
+
+
+def write_rows(excel_path, sheet_name, headers, records, bold_header=False):
+    # 逐条消费 records 写入，返回写入的数据行数（不含表头）
+    if is_xlsx(excel_path):
+        return _write_xlsx(excel_path, sheet_name, headers, records, bold_header)
+    return _write_xls(excel_path, sheet_name, headers, records, bold_header)
+
+
+def _write_xls(excel_path, sheet_name, headers, records, bold_header):
+    import xlwt
+
+    workbook = xlwt.Workbook(encoding='utf-8')
+
+    # 文本格式（所有列都使用文本格式）
+    text_style = xlwt.XFStyle()
+    text_style.num_format_str = '@'  # 强制文本格式
+    header_style = text_style
+    if bold_header:
+        header_font = xlwt.Font()
+        header_font.bold = True
+        header_style = xlwt.XFStyle()
+        header_style.font = header_font
+        header_style.num_format_str = '@'  # 表头统一使用文本格式
+
+    names = _sheet_names(sheet_name)
+    worksheet = None
+    row_idx = XLS_MAX_ROWS
+    count = 0
+    for row_data in records:
+        if row_idx == XLS_MAX_ROWS:  # 当前工作表已满，新建工作表并重复表头
+            worksheet = _new_xls_sheet(workbook, next(names), headers, header_style)
+            row_idx = 1
+        for col_idx, value in enumerate(row_data):
+            if type(value) in (int, float):
+                worksheet.write(row_idx, col_idx, value)
+                continue
+            cell_value = str(value) if value is not None else ''
+            worksheet.write(row_idx, col_idx, cell_value, text_style)
+        row_idx += 1
+        count += 1
+    if worksheet is None:  # 没有数据也保留表头
+        _new_xls_sheet(workbook, next(names), headers, header_style)
+
+    workbook.save(excel_path)
+    return count
+
+
+def _new_xls_sheet(workbook, name, headers, header_style):
+    worksheet = workbook.add_sheet(name)
+    for col_idx, header in enumerate(headers):
+        worksheet.write(0, col_idx, header, header_style)
+    return worksheet
+
+
+# -------------------- .xlsx 流式写出 --------------------
+# 只用到文本单元格与两种样式，直接拼 XML 比通用库快得多
+XLSX_FLUSH_ROWS = 1000  # 每攒够多少行写入一次压缩流
+
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '{sheets}</Types>'
+)
+_XLSX_SHEET_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_XLSX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets>{sheets}</sheets></workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '{sheets}<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/></Relationships>'
+)
+# cellXfs：0 默认，1 文本（内置格式 49 即 @），2 加粗文本
+_XLSX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="宋体"/></font>'
+    '<font><b/><sz val="11"/><name val="宋体"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="49" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>'
+    '<xf numFmtId="49" fontId="1" fillId="0" borderId="0" xfId="0" applyNumberFormat="1" applyFont="1"/>'
+    '</cellXfs><cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+_XLSX_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_XLSX_SHEET_TAIL = '</sheetData></worksheet>'
+
+# XML 1.0 不允许的控制字符
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _col_letter(idx):
+    letters = ''
+    idx += 1
+    while idx:
+        idx, rem = divmod(idx - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def _xlsx_row(row_num, values, style, cols):
+    cells = []
+    for col, value in zip(cols, values):
+        if type(value) in (int, float):
+            cells.append(f'<c r="{col}{row_num}"><v>{value!r}</v></c>')
+            continue
+        text = str(value) if value is not None else ''
+        if not text:
+            cells.append(f'<c r="{col}{row_num}" s="{style}"/>')
+            continue
+        text = escape(_XML_ILLEGAL.sub('', text))
+        space = ' xml:space="preserve"' if text[0].isspace() or text[-1].isspace() else ''
+        cells.append(f'<c r="{col}{row_num}" s="{style}" t="inlineStr"><is><t{space}>{text}</t></is></c>')
+    return f'<row r="{row_num}">{"".join(cells)}</row>'
+
+
+def _write_xlsx(excel_path, sheet_name, headers, records, bold_header):
+    try:
+        return _stream_xlsx(excel_path, sheet_name, headers, records, bold_header)
+    except BaseException:
+        # 中途出错（解析失败、作业取消等）时不留下残缺的文件
+        if os.path.exists(excel_path):
+            os.remove(excel_path)
+        raise
+
+
+def _stream_xlsx(excel_path, sheet_name, headers, records, bold_header):
+    cols = [_col_letter(i) for i in range(max(len(headers), 1))]
+    header_style = 2 if bold_header else 1
+    names = _sheet_names(sheet_name)
+    sheet_names = []
+    count = 0
+    records = iter(records)
+    pending = next(records, None)
+
+    with zipfile.ZipFile(excel_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        # 至少写一个工作表（无数据时只有表头）；每个工作表写满上限后换下一个
+        while not sheet_names or pending is not None:
+            sheet_names.append(next(names))
+            with zf.open(f'xl/worksheets/sheet{len(sheet_names)}.xml', 'w', force_zip64=True) as out:
+                buf = [_XLSX_SHEET_HEAD, _xlsx_row(1, headers, header_style, cols)]
+                row_num = 1
+                while pending is not None and row_num < XLSX_MAX_ROWS:
+                    row_num += 1
+                    buf.append(_xlsx_row(row_num, pending, 1, cols))
+                    count += 1
+                    if len(buf) >= XLSX_FLUSH_ROWS:
+                        out.write(''.join(buf).encode('utf-8'))
+                        buf = []
+                    pending = next(records, None)
+                buf.append(_XLSX_SHEET_TAIL)
+                out.write(''.join(buf).encode('utf-8'))
+
+        n_sheets = range(1, len(sheet_names) + 1)
+        zf.writestr('[Content_Types].xml', _XLSX_CONTENT_TYPES.format(
+            sheets=''.join(_XLSX_SHEET_TYPE.format(n=n) for n in n_sheets)))
+        zf.writestr('_rels/.rels', _XLSX_ROOT_RELS)
+        zf.writestr('xl/workbook.xml', _XLSX_WORKBOOK.format(sheets=''.join(
+            f'<sheet name="{escape(name)}" sheetId="{n}" r:id="rId{n}"/>'
+            for n, name in zip(n_sheets, sheet_names))))
+        zf.writestr('xl/_rels/workbook.xml.rels', _XLSX_WORKBOOK_RELS.format(sheets=''.join(
+            f'<Relationship Id="rId{n}" '
+            f'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            f'Target="worksheets/sheet{n}.xml"/>' for n in n_sheets)))
+        zf.writestr('xl/styles.xml', _XLSX_STYLES)
+    return count
+
+
+# -------------------- 回盘读入 --------------------
+def iter_rows(excel_path, cols, first_row=1):
+    # 产出第一个工作表从 first_row（0 起）开始每行 cols 各列的取值；缺失的单元格为 ''
+    if is_xlsx(excel_path):
+        return _iter_xlsx_rows(excel_path, cols, first_row)
+    return _iter_xls_rows(excel_path, cols, first_row)
+
+
+def _iter_xls_rows(excel_path, cols, first_row):
+    import xlrd
+
+    # 内存映射文件后按需打开：只解析工作簿全局信息（含共享字符串表），不读格式信息；
+    # 工作表部分直接扫描单元格记录，只解码需要的列
+    with open(excel_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        wb = xlrd.open_workbook(file_contents=mm, on_demand=True, formatting_info=False)
+        try:
+            rows = _scan_xls_cells(wb, cols, first_row)
+            if rows is None:
+                # 非常规记录：退回 xlrd 加载整张表，需要的列整列取出后按行拼合
+                sheet = wb.sheet_by_index(0)
+                nrows = max(sheet.nrows - first_row, 0)
+                columns = [sheet.col_values(c, first_row) if c < sheet.ncols else [''] * nrows
+                           for c in cols]
+                rows = list(zip(*columns))
+        finally:
+            wb.release_resources()
+    return iter(rows)
+
+
+# BIFF8 单元格记录类型
+_XLS_EOF = 0x000A
+_XLS_LABELSST = 0x00FD  # 共享字符串
+_XLS_NUMBER = 0x0203    # 浮点数
+_XLS_RK = 0x027E        # 压缩数字
+_XLS_MULRK = 0x00BD     # 同一行连续多个压缩数字
+_XLS_OTHER_VALUES = (0x0204, 0x0006, 0x0205, 0x00D6)  # LABEL、FORMULA、BOOLERR、RSTRING
+
+_unpack_record = struct.Struct('<HHHH').unpack_from  # 记录头 + 行号 + 列号
+_unpack_uint = struct.Struct('<I').unpack_from
+_unpack_double = struct.Struct('<d').unpack_from
+_unpack_ushort = struct.Struct('<H').unpack_from
+
+
+def _scan_xls_cells(wb, cols, first_row):
+    # 顺序扫描第一个工作表的 BIFF8 记录，只解码 cols 中的列，取值与 xlrd 一致；
+    # 行数按任意列中出现取值的最大行计算（与 xlrd 的 nrows 相同）
+    # 需要的列里出现 LABEL/FORMULA 等少见记录，或不是 BIFF8 时返回 None
+    from xlrd.sheet import unpack_RK
+
+    mem = getattr(wb, 'mem', None)
+    positions = getattr(wb, '_sh_abs_posn', None)
+    sst = getattr(wb, '_sharedstrings', None)
+    if wb.biff_version < 80 or mem is None or not positions or sst is None:
+        return None
+
+    wanted = {c: i for i, c in enumerate(cols)}
+    width = len(cols)
+    rows = {}
+    max_row = -1
+    pos = positions[0]
+    end = len(mem) - 8
+    while pos <= end:
+        code, length, row, col = _unpack_record(mem, pos)
+        data = pos + 4
+        pos = data + length
+        if code == _XLS_LABELSST or code == _XLS_NUMBER or code == _XLS_RK:
+            if row > max_row:
+                max_row = row
+            slot = wanted.get(col)
+            if slot is None:
+                continue
+            if code == _XLS_LABELSST:
+                value = sst[_unpack_uint(mem, data + 6)[0]]
+            elif code == _XLS_NUMBER:
+                value = _unpack_double(mem, data + 6)[0]
+            else:
+                value = unpack_RK(mem[data + 6:data + 10])
+            values = rows.get(row)
+            if values is None:
+                values = rows[row] = [''] * width
+            values[slot] = value
+        elif code == _XLS_MULRK:
+            if row > max_row:
+                max_row = row
+            last_col = _unpack_ushort(mem, pos - 2)[0]
+            for c in range(col, last_col + 1):
+                slot = wanted.get(c)
+                if slot is None:
+                    continue
+                off = data + 6 + (c - col) * 6
+                values = rows.get(row)
+                if values is None:
+                    values = rows[row] = [''] * width
+                values[slot] = unpack_RK(mem[off:off + 4])
+        elif code == _XLS_EOF:
+            break
+        elif code in _XLS_OTHER_VALUES:
+            if col in wanted:
+                return None
+            if row > max_row:
+                max_row = row
+
+    empty = ('',) * width
+    return [tuple(rows[r]) if r in rows else empty for r in range(first_row, max_row + 1)]
+
+
+def _local(tag):
+    # 去掉命名空间（兼容 transitional 与 strict 两种 OOXML 命名空间）
+    return tag.rsplit('}', 1)[-1]
+
+
+def _col_index(ref):
+    # 'AB12' → 27
+    idx = 0
+    for ch in ref:
+        if ch.isdigit():
+            break
+        idx = idx * 26 + (ord(ch.upper()) - 64)
+    return idx - 1
+
+
+def _first_sheet_path(zf):
+    rel_id = None
+    for _, elem in iterparse(zf.open('xl/workbook.xml')):
+        if _local(elem.tag) == 'sheet':
+            rel_id = next(v for k, v in elem.attrib.items() if _local(k) == 'id')
+            break
+    for _, elem in iterparse(zf.open('xl/_rels/workbook.xml.rels')):
+        if _local(elem.tag) == 'Relationship' and elem.get('Id') == rel_id:
+            target = elem.get('Target')
+            return target.lstrip('/') if target.startswith('/') else posixpath.normpath('xl/' + target)
+    raise ValueError('xlsx 文件中没有工作表')
+
+
+def _shared_strings(zf):
+    # 共享字符串表：每个 <si> 取其下 <t> 文本（跳过注音 <rPh>）
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    strings = []
+    parts = []
+    skip = 0
+    for event, elem in iterparse(zf.open('xl/sharedStrings.xml'), events=('start', 'end')):
+        tag = _local(elem.tag)
+        if event == 'start':
+            if tag == 'rPh':
+                skip += 1
+            continue
+        if tag == 't' and not skip:
+            parts.append(elem.text or '')
+        elif tag == 'rPh':
+            skip -= 1
+        elif tag == 'si':
+            strings.append(''.join(parts))
+            parts = []
+            elem.clear()
+    return strings
+
+
+def _cell_value(cell_type, text, strings):
+    # 与 xlrd 的取值类型对齐：数字 float，布尔/错误 int，其余 str
+    if cell_type == 's':
+        return strings[int(text)]
+    if cell_type in ('str', 'inlineStr'):
+        return text
+    if cell_type in ('b', 'e'):
+        return int(text) if text.isdigit() else text
+    return float(text)
+
+
+def _iter_xlsx_rows(excel_path, cols, first_row):
+    wanted = {c: i for i, c in enumerate(cols)}
+    with zipfile.ZipFile(excel_path) as zf:
+        strings = _shared_strings(zf)
+        sheet_path = _first_sheet_path(zf)
+        row_idx = -1
+        values = None
+        filled = False
+        col_idx = -1
+        for event, elem in iterparse(zf.open(sheet_path), events=('start', 'end')):
+            tag = _local(elem.tag)
+            if event == 'start':
+                if tag == 'row':
+                    r = elem.get('r')
+                    row_idx = int(r) - 1 if r else row_idx + 1
+                    values = [''] * len(cols)
+                    filled = False  # 只有格式、没有取值的行（如加粗的空行）不产出，与 xlrd 的 nrows 一致
+                    col_idx = -1
+                continue
+            if tag == 'c':
+                ref = elem.get('r')
+                col_idx = _col_index(ref) if ref else col_idx + 1
+                slot = wanted.get(col_idx)
+                if slot is not None and row_idx >= first_row:
+                    cell_type = elem.get('t', 'n')
+                    if cell_type == 'inlineStr':
+                        text = ''.join(t.text or '' for t in elem.iter() if _local(t.tag) == 't')
+                    else:
+                        v = next((child for child in elem if _local(child.tag) == 'v'), None)
+                        text = v.text if v is not None else None
+                    if text is not None:
+                        values[slot] = _cell_value(cell_type, text, strings)
+                        filled = True
+            elif tag == 'row':
+                if row_idx >= first_row and filled:
+                    yield tuple(values)
+                elem.clear()
@@ -0,0 +1,192 @@
+import datetime
+import sqlite3
+from pathlib import Path
+
+from cache import app_path
+
+# 处理历史库（SQLite）：每次报盘/回盘转换把解析出的记录写入本地数据库，事后可按卡号、姓名、协议书号、批次日期查询，
+# 不必再翻旧的 xls。报盘记录来自报盘 txt，回盘记录来自回盘 Excel（含处理标志）
+#   · 转换过程中记录分批插入，转换成功后整批在一个事务里提交，失败整批丢弃
+#   · 卡号、姓名、协议书号都与批次日期建联合索引，跨多年的批次按卡号等查询也只需毫秒级
+# 数据库默认 %LOCALAPPDATA%\jinzhoubank\history.sqlite3（其他系统 ~/.cache/jinzhoubank），
+# 可用环境变量 JZB_HISTORY_DB 指定文件，设为 off 则不记录。历史库出错一律忽略，不影响转换
+
+HISTORY_ENV = 'JZB_HISTORY_DB'
+INSERT_BATCH = 5000  # 每批插入的记录数
+BUSY_TIMEOUT = 10    # 其他进程（批量处理、监控模式）正在写入时最多等待的秒数
+SCHEMA_VERSION = 1
+CACHE_KIB = 64 * 1024  # 每个连接的页缓存上限
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS batches (
+    id           INTEGER PRIMARY KEY,
+    func         TEXT NOT NULL,     -- LocalOffer / OtherOffer / LocalReply / OtherReply
+    batch_date   TEXT NOT NULL,     -- 处理日期 YYYY-MM-DD
+    created      TEXT NOT NULL,     -- 处理时间
+    txt          TEXT,              -- 报盘 txt
+    excel        TEXT,              -- 回盘 Excel（报盘为空）
+    output       TEXT,              -- 输出文件（报盘为 Excel，回盘为回盘 txt；回盘不一致时为空）
+    ok           INTEGER NOT NULL,  -- 回盘核对是否一致（报盘恒为 1）
+    report       TEXT,              -- 差异报告
+    rows         INTEGER NOT NULL,
+    amount_cents INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    batch_id     INTEGER NOT NULL REFERENCES batches(id),
+    batch_date   TEXT NOT NULL,
+    name         TEXT NOT NULL,
+    card         TEXT NOT NULL,
+    agreement    TEXT NOT NULL,     -- 协议书号（本行为空）
+    amount_cents INTEGER,
+    remark       TEXT NOT NULL,
+    flag         TEXT NOT NULL      -- 处理标志（报盘为空）
+);
+CREATE INDEX IF NOT EXISTS records_card ON records(card, batch_date);
+CREATE INDEX IF NOT EXISTS records_name ON records(name, batch_date);
+CREATE INDEX IF NOT EXISTS records_agreement ON records(agreement, batch_date);
+CREATE INDEX IF NOT EXISTS records_date ON records(batch_date);
+'''
+
+QUERY_FIELDS = ('batch_date', 'func', 'name', 'card', 'agreement', 'amount_cents', 'remark', 'flag',
+                'ok', 'txt', 'excel', 'output')
+
+
+def history_path():
+    return app_path(HISTORY_ENV, 'history.sqlite3')
+
+
+def connect(path=None):
+    path = Path(path) if path is not None else history_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    conn.execute('PRAGMA journal_mode=WAL')   # 写入时不阻塞查询
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA cache_size=-{CACHE_KIB}')  # 索引页多留在内存里，大批次插入不必反复读盘
+    if conn.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+        conn.executescript(SCHEMA)
+        conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+    return conn
+
+
+class Batch:
+    # 一次转换的历史记录：with 块内用 tap/add 写入记录，commit() 提交；未提交就离开 with 块（出错）则整批丢弃
+    # 记录先分批插入本连接的临时表，提交时在一个事务里连同批次信息写入历史库：
+    # 转换期间不占用历史库的写锁，批量处理、监控模式的多个进程可以同时转换
+    # 历史库不可用或已关闭时各方法什么都不做
+    def __init__(self, result):
+        self.result = result
+        self.conn = None
+        self.rows = 0
+        self.amount_cents = 0
+        self._pending = []
+        if history_path() is None:
+            return
+        self.created = datetime.datetime.now()
+        try:
+            self.conn = connect()
+            self.conn.execute('CREATE TEMP TABLE pending (name, card, agreement, amount_cents, remark, flag)')
+        except (OSError, sqlite3.Error):  # 目录无法创建、不可写等
+            self._close()
+
+    @property
+    def enabled(self):
+        return self.conn is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._close()
+        return False
+
+    def _close(self):
+        if self.conn is not None:
+            self.conn.close()  # 未提交的内容随连接关闭丢弃
+            self.conn = None
+
+    def add(self, name, card, agreement, amount_cents, remark, flag=''):
+        if self.conn is None:
+            return
+        self._pending.append((name, card, agreement, amount_cents, remark, flag))
+        self.rows += 1
+        if isinstance(amount_cents, int):
+            self.amount_cents += amount_cents
+        if len(self._pending) >= INSERT_BATCH:
+            self._flush()
+
+    def tap(self, rows, to_record):
+        # 透传写入 Excel 的行，同时把 to_record(row) 得到的记录写入历史库
+        if self.conn is None:
+            yield from rows
+            return
+        add = self.add
+        for row in rows:
+            add(*to_record(row))
+            yield row
+
+    def _flush(self):
+        try:
+            self.conn.executemany('INSERT INTO pending VALUES (?, ?, ?, ?, ?, ?)', self._pending)
+        except (OSError, sqlite3.Error):
+            self._close()
+        self._pending = []
+
+    def commit(self):
+        # 转换成功后调用：批次信息与全部记录在一个事务里写入历史库（耗时计入 history 阶段）
+        if self.conn is None:
+            return
+        with self.result.stage('history'):
+            self._commit()
+        self._close()
+
+    def _commit(self):
+        if self._pending:
+            self._flush()
+            if self.conn is None:
+                return
+        result = self.result
+        batch_date = self.created.date().isoformat()
+        try:
+            cur = self.conn.execute(
+                'INSERT INTO batches (func, batch_date, created, txt, excel, output, ok, report, rows, amount_cents) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (result.func, batch_date, self.created.isoformat(timespec='seconds'),
+                 result.inputs.get('txt'), result.inputs.get('excel'),
+                 None if result.output is None else str(result.output), int(result.ok),
+                 None if result.report is None else str(result.report.path),
+                 self.rows, self.amount_cents))
+            # 按卡号顺序插入，卡号索引的页面顺次写入，大批次提交更快
+            self.conn.execute('INSERT INTO records SELECT ?, ?, * FROM pending ORDER BY card',
+                              (cur.lastrowid, batch_date))
+            self.conn.commit()
+        except (OSError, sqlite3.Error):
+            pass
+
+
+def query(card=None, name=None, agreement=None, since=None, until=None, limit=100, path=None):
+    # 按卡号/姓名/协议书号（精确匹配）与批次日期范围查询，最近的批次在前；返回 dict 列表
+    where, params = [], []
+    for column, value in (('card', card), ('name', name), ('agreement', agreement)):
+        if value:
+            where.append(f'r.{column} = ?')
+            params.append(value)
+    if since:
+        where.append('r.batch_date >= ?')
+        params.append(since)
+    if until:
+        where.append('r.batch_date <= ?')
+        params.append(until)
+    sql = ('SELECT r.batch_date, b.func, r.name, r.card, r.agreement, r.amount_cents, r.remark, r.flag, '
+           'b.ok, b.txt, b.excel, b.output FROM records r JOIN batches b ON b.id = r.batch_id')
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    sql += ' ORDER BY r.batch_date DESC, r.rowid DESC LIMIT ?'  # 与各索引的顺序一致，不必另行排序
+    params.append(limit)
+    path = Path(path) if path is not None else history_path()
+    if path is None or not path.exists():
+        return []
+    conn = connect(path)
+    try:
+        return [dict(zip(QUERY_FIELDS, row)) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
@@ -0,0 +1,348 @@
+import re
+import functools
+
+from excel import iter_rows
+from money import AMOUNT_DECIMALS, YUAN, cents_from_units, format_cents, format_units, parse_cents
+
+# 报盘/回盘文件布局：每种格式（本行、他行……）用一份 Layout 声明 txt 的各列、回盘核对的 key、回盘 Excel 的列、
+# 报盘 Excel 的各列取法；逐行解析报盘、扫描报盘 txt 的 key、读回盘 Excel 的函数都按声明生成源码后编译，
+# 每种布局只在第一次用到时生成一次。新增银行或缴费单位的格式只需再写一份声明，解析路径与现有格式相同
+#   · txt 各列从 0 起编号，按空白切分；金额列以分为单位，报盘/回盘 Excel 中的金额单位由 amount_scale 声明
+#     （每单位的分数：100 为元、两位小数，默认；10 为角；1 为分、整数）
+#   · 生成的源码保存在 Layout.sources 中，便于排查
+
+# 报盘 Excel 每一列的取法：
+#   ('field', i)             txt 第 i 列
+#   ('or', i, 默认值)         txt 第 i 列，为空时取默认值
+#   ('suffix', i, n, 默认值)  txt 第 i 列的后 n 个字符，该列不足 n 个字符时取默认值
+#   ('amount',)              金额列，整数分按 amount_scale 格式化（默认为两位小数的元）
+#   ('const', 值)             常量
+# key 的各字段：(用途, 名称, txt 列, 回盘 Excel 列)，用途为 name/card/agreement/amount/remark 之一
+
+FIELDS = 10             # 报盘 txt 每行的列数
+HISTORY_ROLES = ('name', 'card', 'agreement', 'amount', 'remark')  # 写入历史库的字段顺序
+
+REMARK_WIDTH = 4        # 回盘回写处理标志的行：备注列正好是 4 位数字
+
+
+def reply_line_pattern(col, width, fields):
+    # 回盘回写处理标志的行（解码切分时逐行匹配）：第 col 列（备注）正好是 width 位数字
+    # 分组：前面部分、备注列、后面部分
+    tail = rb'(\s+\S+.*)' if col < fields - 1 else rb'(\s*)'
+    return re.compile(rb'^((?:\S+\s+){%d})(\d{%d})%s$' % (col, width, tail))
+
+
+def remark_offset(line_b, tokens, col, width):
+    # 字节切分下第 col 列（正好 width 位数字）的起始偏移，条件与 reply_line_pattern 相同；不满足返回 None
+    remark = tokens[col]
+    if len(remark) != width or not remark.isdigit() or line_b[:1].isspace():
+        return None
+    head = line_b.rstrip()
+    for token in tokens[:col:-1]:  # 从行尾去掉备注列之后的各列
+        head = head[:len(head) - len(token)].rstrip()
+    return len(head) - width
+
+
+LAYOUTS = {}  # 名称 → Layout
+
+
+def get_layout(name):
+    return LAYOUTS[name]
+
+
+class Layout:
+    def __init__(self, name, fields, key, flag_col, columns, headers, sheet, bold_header=False,
+                 amount_col=6, pattern=None, digit_cols=(), skip_mark=None, summary_last=False,
+                 strict_amount=False, remark_width=REMARK_WIDTH, amount_scale=YUAN):
+        self.name = name
+        self.fields = fields          # txt 每行的列数
+        self.key = key                # 回盘核对的 key
+        self.flag_col = flag_col      # 回盘 Excel 中处理标志所在列
+        self.columns = columns        # 报盘 Excel 各列的取法
+        self.headers = headers        # 报盘 Excel 表头
+        self.sheet = sheet
+        self.bold_header = bold_header
+        self.amount_col = amount_col
+        self.pattern = pattern        # 报盘按此正则逐行匹配（可含空格的列），为空时按空白切分
+        self.digit_cols = digit_cols  # 必须为纯数字的列（与 pattern 中的 \d+ 一致，供向量化解析判断）
+        self.skip_mark = skip_mark    # 含此字样的行（汇总行）跳过
+        self.summary_last = summary_last  # 文件最后一行是汇总行
+        self.strict_amount = strict_amount  # 金额不是纯数字时：True 按十进制解析，出错的行跳过；False 按 0 计
+        if amount_scale not in AMOUNT_DECIMALS:
+            raise ValueError(f'{name}：金额单位 {amount_scale} 分不受支持，'
+                             f'应为 {"、".join(map(str, AMOUNT_DECIMALS))} 之一')
+        self.amount_scale = amount_scale  # 报盘/回盘 Excel 中金额的单位（每单位的分数）
+        # 回盘回写处理标志的位置：key 中备注所在的 txt 列，该列正好 remark_width 位数字的行才回写
+        self.remark_col = next(col for role, _, col, _ in key if role == 'remark')
+        self.remark_width = remark_width
+        if not 0 < self.remark_col < fields:
+            raise ValueError(f'{name}：备注列 {self.remark_col} 超出 {fields} 列')
+        self.reply_pattern = reply_line_pattern(self.remark_col, remark_width, fields)
+        self.sources = {}
+        LAYOUTS[name] = self
+
+    def __reduce__(self):
+        # 按名称传给子进程（生成的函数不能序列化），子进程中取同名的布局
+        return get_layout, (self.name,)
+
+    @property
+    def key_cols(self):
+        return tuple(col for _, _, col, _ in self.key)
+
+    @property
+    def key_names(self):
+        return tuple(label for _, label, _, _ in self.key)
+
+    @property
+    def xls_cols(self):
+        return tuple(col for _, _, _, col in self.key) + (self.flag_col,)
+
+    def _compile(self, name, source, **namespace):
+        self.sources[name] = source
+        exec(compile(source, f'<layout {self.name}.{name}>', 'exec'), namespace)
+        return namespace[name]
+
+    # -------------------- 逐行解析报盘 --------------------
+    def _column_expr(self, spec, field):
+        kind = spec[0]
+        if kind == 'field':
+            return field(spec[1])
+        if kind == 'or':
+            return f'({field(spec[1])} or {spec[2]!r})'
+        if kind == 'suffix':
+            _, i, n, default = spec
+            return f'({field(i)}[-{n}:] if len({field(i)}) >= {n} else {default!r})'
+        if kind == 'amount':
+            return 'format_cents(cents)' if self.amount_scale == YUAN else f'format_units(cents, {self.amount_scale})'
+        return repr(spec[1])
+
+    def column_of(self, role):
+        # key 中某一用途（name/card/…）的字段在报盘 Excel 行中的位置；没有该字段返回 None
+        for role_, _, col, _ in self.key:
+            if role_ == role:
+                break
+        else:
+            return None
+        for j, spec in enumerate(self.columns):
+            if role == 'amount':
+                if spec[0] == 'amount':
+                    return j
+            elif spec[0] in ('field', 'or') and spec[1] == col:
+                return j
+        return None
+
+    @functools.cached_property
+    def offer_rows(self):
+        # offer_rows(lines, skip, total=None, first_line=1, check=None)：产出写入报盘 Excel 的行，无法解析的行交给 skip(说明)
+        # total（CentsTotal）不为空时累加笔数与整数分金额；first_line 为 lines 第一行在文件中的行号
+        # check 不为空时对产出的每一行调用 check(行号, 行)（字段校验）
+        return self._offer_rows('offer_rows', 'lines, skip, total=None, first_line=1, check=None',
+                                'enumerate(lines, first_line)', 'row')
+
+    @functools.cached_property
+    def numbered_offer_rows(self):
+        # numbered_offer_rows(numbered, skip, total=None, check=None)：同 offer_rows，但逐行给出 (行号, 行)，
+        # 产出 (行号, 写入 Excel 的行)；供向量化解析把不连续的不规整行一次交给逐行解析
+        return self._offer_rows('numbered_offer_rows', 'numbered, skip, total=None, check=None',
+                                'numbered', '(line_num, row)')
+
+    def _offer_rows(self, name, params, numbered, result):
+        # 生成逐行解析报盘的函数：numbered 为 (行号, 行) 的来源，result 为每行产出的内容
+        if self.pattern is not None:
+            field = lambda i: f'g({i + 1}).strip()'
+            head = ['    match_line = pattern.match',
+                    f'    for line_num, line in {numbered}:',
+                    '        line = line.strip()',
+                    '        if not line:',
+                    '            continue',
+                    '        match = match_line(line)',
+                    '        if match is None:',
+                    '            skip(f"行{line_num}：未匹配格式")',
+                    '            continue',
+                    '        g = match.group']
+            amount = f'g({self.amount_col + 1})'
+        else:
+            field = lambda i: f't[{i}]'
+            head = [f'    for line_num, line in {numbered}:',
+                    "        line = line.rstrip('\\n')",
+                    ("        if skip_mark in line or line.strip() == '':" if self.skip_mark else
+                     "        if line.strip() == '':"),
+                    '            continue',
+                    '        t = line.split()',
+                    f'        if len(t) != {self.fields}:',
+                    '            if skip is not None:',
+                    f'                skip(f"行{{line_num}}：共 {{len(t)}} 列，应为 {self.fields} 列")',
+                    '            continue']
+            amount = f't[{self.amount_col}]'
+        row = ', '.join(self._column_expr(spec, field) for spec in self.columns)
+        if self.strict_amount:
+            body = ['        try:',
+                    f'            cents = parse_cents({amount})',
+                    '        except ValueError as e:',
+                    '            skip(f"行{line_num}：解析错误 - {str(e)}")',
+                    '            continue']
+        else:
+            body = [f'        a = {amount}',
+                    '        cents = int(a) if a.isdigit() and a.isascii() else 0']
+        body += ['        if total is not None:',
+                 '            total.add(cents)',
+                 f'        row = [{row}]',
+                 '        if check is not None:',
+                 '            check(line_num, row)',
+                 f'        yield {result}']
+        source = '\n'.join([f'def {name}({params}):'] + head + body) + '\n'
+        return self._compile(name, source, pattern=self.pattern, skip_mark=self.skip_mark,
+                             parse_cents=parse_cents, format_cents=format_cents, format_units=format_units)
+
+    # -------------------- 报盘 txt 的 key（回盘核对） --------------------
+    def _scanner(self, name, params, split, setup, patch, tap=False):
+        # 单遍扫描报盘 txt 的各行：返回 key 集合、重复 key 的笔数、可回写行的 (备注列起始偏移, key)、跳过的行数
+        # key 中的金额转为整数分（前导零不影响比较）；其他写法原样保留，必然与 xls 不匹配而列入差异
+        # offset 为 lines 第一行在文件中的字节偏移（按块扫描时）；tap 时原样产出各行，扫描结果最后交给 done(结果)
+        amount = next(col for role, _, col, _ in self.key if role == 'amount')
+        key = ', '.join('(int(a) if a.isdigit() and a.isascii() else a)' if role == 'amount' else f't[{col}]'
+                        for role, _, col, _ in self.key)
+        source = '\n'.join([
+            f'def {name}({params}):',
+            '    txt_keys = set()',
+            '    txt_dups = {}  # 重复出现的 key → 总笔数',
+            '    patches = []',
+            f'    skipped = 0    # 不是 {self.fields} 列的行（汇总行、空行等）',
+            '    add_key = txt_keys.add',
+            *setup,
+            '    for line_b in lines:',
+            f'        t = {split}',
+            f'        if len(t) == {self.fields}:',
+            f'            a = t[{amount}]',
+            f'            key = ({key},)',
+            '            if key in txt_keys:',
+            '                txt_dups[key] = txt_dups.get(key, 1) + 1',
+            '            else:',
+            '                add_key(key)',
+            *patch,
+            '        else:',
+            '            skipped += 1',
+            '        offset += len(line_b)',
+            *(['        yield line_b',
+               '    done((txt_keys, txt_dups, patches, skipped))'] if tap else
+              ['    return txt_keys, txt_dups, patches, skipped']),
+        ]) + '\n'
+        return self._compile(name, source, remark_offset=remark_offset, pattern=self.reply_pattern)
+
+    def _byte_scanner(self, name, params, tap=False):
+        return self._scanner(name, params, 'line_b.split()', [], [
+            f'            start = remark_offset(line_b, t, {self.remark_col}, {self.remark_width})',
+            '            if start is not None:',
+            '                patches.append((offset + start, key))'], tap)
+
+    @functools.cached_property
+    def scan_bytes(self):
+        # scan_bytes(lines, offset=0)：字节切分，key 各字段保持 bytes（金额为整数分），整行不解码
+        return self._byte_scanner('scan_bytes', 'lines, offset=0')
+
+    @functools.cached_property
+    def tap_bytes(self):
+        # tap_bytes(lines, done, offset=0)：同 scan_bytes，但边扫描边原样产出各行，供报盘解析在同一遍中顺带扫描
+        return self._byte_scanner('tap_bytes', 'lines, done, offset=0', tap=True)
+
+    @functools.cached_property
+    def scan_decoded(self):
+        # scan_decoded(lines, enc, offset=0)：逐行解码后切分，用于不满足字节切分前提的编码
+        return self._scanner('scan_decoded', 'lines, enc, offset=0', "line_b.decode(enc).rstrip('\\r\\n').split()",
+                             ['    match_line = pattern.match'], [
+            '            m = match_line(line_b)',
+            '            if m:',
+            '                patches.append((offset + m.start(2), key))'])
+
+    # -------------------- 回盘 Excel --------------------
+    @functools.cached_property
+    def reply_pairs(self):
+        # reply_pairs(excel_path)：逐行产出回盘 Excel 的 (key, 处理标志)，只读用到的列；金额按 amount_scale 换算为整数分
+        parts = [f'cents_from_units(row[{j}], {self.amount_scale})' if role == 'amount' else f'str(row[{j}]).strip()'
+                 for j, (role, _, _, _) in enumerate(self.key)]
+        source = '\n'.join([
+            'def reply_pairs(excel_path):',
+            f'    for row in iter_rows(excel_path, {self.xls_cols!r}):',
+            f'        yield ({", ".join(parts)},), str(row[{len(self.key)}]).strip()',
+        ]) + '\n'
+        return self._compile('reply_pairs', source, iter_rows=iter_rows, cents_from_units=cents_from_units)
+
+    # -------------------- 历史库记录 --------------------
+    @functools.cached_property
+    def offer_record(self):
+        # 写出的报盘行 → 历史库记录 (姓名, 卡号, 协议书号, 金额(分), 备注)
+        # 金额列按 amount_scale 的小数位数格式化，去掉小数点即为分
+        roles = {role: f'row[{self.column_of(role)}]' for role, _, _, _ in self.key}
+        roles['amount'] = f"int({roles['amount']}.replace('.', ''))"
+        record = ', '.join(roles.get(role, "''") for role in HISTORY_ROLES)
+        return self._compile('offer_record', f'def offer_record(row):\n    return {record}\n')
+
+    @functools.cached_property
+    def key_record(self):
+        # 回盘 key → 历史库记录（同 offer_record）
+        roles = {role: f'key[{j}]' for j, (role, _, _, _) in enumerate(self.key)}
+        record = ', '.join(roles.get(role, "''") for role in HISTORY_ROLES)
+        return self._compile('key_record', f'def key_record(key):\n    return {record}\n')
+
+
+# -------------------- 本行 --------------------
+LOCAL = Layout(
+    '本行', FIELDS,
+    key=(('name', '姓名', 4, 0),
+         ('card', '卡号', 3, 1),
+         ('amount', '金额(分)', 6, 2),
+         ('remark', '备注', 8, 3)),
+    flag_col=5,
+    columns=(('field', 4),     # 姓名/公司名
+             ('field', 3),     # 卡号
+             ('amount',),
+             ('field', 8),     # 4 位备注
+             ('const', None),  # 实处理金额
+             ('const', None)),  # 处理标志
+    headers=['姓名\n(不超过60个字节)', '卡号', '应处理金额(必须小于1亿)',
+             '备注(不超过12个字节)', '实处理金额', '处理标志'],
+    sheet='数据', bold_header=True,
+    # 正则表达式匹配多空格分隔的字段
+    pattern=re.compile(
+        r'^(\S+)\s+'  # 字段1：固定前缀
+        r'(\d+)\s+'  # 字段2：序号
+        r'(\S+)\s+'  # 字段3：固定码
+        r'(\S+)\s+'  # 字段4：卡号
+        r'(.+?)\s+'  # 字段5：姓名/公司名（支持含空格）
+        r'(\S+)\s+'  # 字段6：固定值1
+        r'(\S+)\s+'  # 字段7：应处理金额
+        r'(\S+)\s+'  # 字段8：中间码1
+        r'(\S*)\s*'  # 字段9：中间码2（允许后面空格数量任意）
+        r'(\S*)$'  # 字段10：备注（允许空）
+    ),
+    digit_cols=(1,),
+    summary_last=True,
+    strict_amount=True,
+)
+
+# -------------------- 他行 --------------------
+OTHER = Layout(
+    '他行', FIELDS,
+    key=(('name', '姓名', 4, 0),
+         ('card', '卡号', 3, 1),
+         ('agreement', '协议书号', 7, 5),
+         ('amount', '金额(分)', 6, 7),
+         ('remark', '备注', 8, 8)),
+    flag_col=10,
+    columns=(('field', 4),                     # 姓名
+             ('field', 3),                     # 卡号
+             ('or', 5, '1'),                   # 行别
+             ('suffix', 2, 12, ''),            # 跨行行号
+             ('suffix', 0, 5, '00201'),        # 业务种类
+             ('field', 7),                     # 协议书号
+             ('const', ''),                    # 账号地址
+             ('amount',),
+             ('field', 8),                     # 备注
+             ('const', ''),                    # 实处理金额
+             ('const', '')),                   # 处理标志
+    headers=["姓名\n(不超过60个字节)", "卡号", "行别", "跨行行号", "业务种类",
+             "协议书号", "账号地址", "应处理金额(必须小于1亿)",
+             "备注(不超过12个字节)", "实处理金额", "处理标志"],
+    sheet='sheet1',
+    skip_mark='天津泰达津联自来水有限公司',  # 他行报盘中含此字样的行（汇总行）跳过
+)
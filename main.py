@@ -1,13 +1,17 @@
 import os
+import sys
+import time
 import datetime
 import tkinter as tk
 from pathlib import Path
 from tkinter import filedialog, messagebox,scrolledtext,ttk
-from utils import LocalOffer, LocalReply, OtherOffer, OtherReply
+from worker import Job, JobQueue
+
+# 转换模块（utils/batch 及其依赖的 xlrd、xlwt 等）在首次使用时才导入，窗口先出现
 
 
 class App(tk.Tk):
-    NAV_NAMES = ['本行报盘', '本行回盘', '他行报盘', '他行回盘']
+    NAV_NAMES = ['本行报盘', '本行回盘', '他行报盘', '他行回盘', '批量处理']
     # 优化配色方案（更现代柔和）
     COLORS = {
         'bg': '#f0f2f5',  # 页面背景（浅灰）
@@ -31,6 +35,9 @@ class App(tk.Tk):
         self.minsize(800, 550)  # 最小尺寸限制
         self.configure(bg=self.COLORS['bg'])
 
+        # 后台作业队列：所有页面共用，转换在工作线程中依次执行
+        self.jobs = JobQueue()
+
         # 顶部导航栏（带阴影效果）
         nav_frame = tk.Frame(
             self,
@@ -78,7 +85,7 @@ class App(tk.Tk):
 
         # 初始化页面（每个页面用卡片包裹）
         self.frames = {}
-        for F in (LocalOfferPage, LocalReplyPage, OtherOfferPage, OtherReplyPage):
+        for F in (LocalOfferPage, LocalReplyPage, OtherOfferPage, OtherReplyPage, BatchPage):
             page_name = F.page_name
             # 页面外层卡片
             card = tk.Frame(
@@ -181,6 +188,37 @@ class _BasePage(tk.Frame):
         self.btn_frame = tk.Frame(self.content, bg=controller.COLORS['nav_bg'])
         self.btn_frame.pack(fill='x', pady=25)
 
+        # 进度区：进度条 + 速度/剩余时间 + 取消按钮
+        self.progress_frame = tk.Frame(self.content, bg=controller.COLORS['nav_bg'])
+        self.progress_frame.pack(fill='x')
+        self.progress_bar = ttk.Progressbar(self.progress_frame, mode='determinate', maximum=1.0)
+        self.progress_bar.pack(side='left', fill='x', expand=True, padx=(0, 12))
+        self.progress_label = tk.Label(
+            self.progress_frame,
+            text='',
+            width=30,
+            font=('Microsoft YaHei', 9),
+            bg=controller.COLORS['nav_bg'],
+            fg=controller.COLORS['text_light'],
+            anchor='w'
+        )
+        self.progress_label.pack(side='left')
+        self.cancel_btn = tk.Button(
+            self.progress_frame,
+            text='取消',
+            width=8,
+            font=('Microsoft YaHei', 10),
+            bg=controller.COLORS['btn_normal'],
+            fg=controller.COLORS['text'],
+            relief=tk.FLAT,
+            bd=1,
+            state='disabled',
+            command=self.cancel_job
+        )
+        self.cancel_btn.pack(side='left', padx=(12, 0))
+        self.controller.bind_button_events(self.cancel_btn)
+        self.job = None
+
         # 底部状态栏（卡片式）
         self.status_frame = tk.Frame(
             self.content,
@@ -296,7 +334,61 @@ class _BasePage(tk.Frame):
         btn.pack(side='left')
         self.controller.bind_button_events(btn)
 
+    # 报盘页的输出格式选项：勾选后输出 .xlsx（流式写出，无行数上限），否则按银行模板输出 .xls
+    def build_xlsx_option(self):
+        var = tk.BooleanVar(value=False)
+        tk.Checkbutton(
+            self.input_frame,
+            text='输出 .xlsx（大文件推荐；.xls 超过 65535 行自动分表）',
+            variable=var,
+            font=('Microsoft YaHei', 9),
+            bg=self.controller.COLORS['nav_bg'],
+            fg=self.controller.COLORS['text_light'],
+            activebackground=self.controller.COLORS['nav_bg'],
+            anchor='w'
+        ).pack(fill='x', padx=(140, 0))
+        return var
+
+    # 回盘页的“查看差异”按钮：核对不一致时可用，打开分页的差异明细窗口
+    def build_diff_button(self):
+        self.diff_report = None
+        self.diff_btn = tk.Button(
+            self.btn_frame,
+            text='查看差异',
+            width=15,
+            height=1,
+            font=('Microsoft YaHei', 10),
+            bg=self.controller.COLORS['btn_normal'],
+            fg=self.controller.COLORS['text'],
+            relief=tk.FLAT,
+            bd=1,
+            highlightbackground=self.controller.COLORS['border'],
+            highlightthickness=1,
+            state='disabled',
+            command=self.show_diff
+        )
+        self.diff_btn.pack(side='left', padx=(20, 0))
+        self.controller.bind_button_events(self.diff_btn)
+
+    def set_diff_report(self, report):
+        # report 为 None 表示核对一致；不一致时直接打开差异窗口
+        self.diff_report = report
+        self.diff_btn.config(state='disabled' if report is None else 'normal')
+        if report is not None:
+            self.show_diff()
+
+    def show_diff(self):
+        if self.diff_report is None:
+            return
+        from diffview import DiffViewer
+        DiffViewer(self, self.diff_report, f'{self.page_name}差异明细')
+
     def browse_file(self, entry: tk.StringVar, file_type: str):
+        if file_type == 'folder':
+            path = filedialog.askdirectory(title='选择文件夹')
+            if path:
+                entry.set(path)
+            return
         ftypes = [('Text文件', '*.txt')] if file_type == 'txt' else \
             [('Excel文件', '*.xls *.xlsx')] if file_type == 'excel' else \
                 [('所有文件', '*.*')]
@@ -307,23 +399,77 @@ class _BasePage(tk.Frame):
         if path:
             entry.set(path)
 
+    # job_func 返回转换结果（ConvertResult），成功后显示输出路径、各阶段耗时与未处理行示例
     def run_job(self, job_func, success_msg):
-        self.display_status('处理中...', success=None)
-        try:
-            out_path = job_func()
+        def on_done(result):
             now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            skipped = ''.join(f'\n⚠ {line}' for line in result.skipped[:5])
+            validation = result.validation
+            if validation is not None:
+                skipped = (f'\n⚠ 字段校验发现 {validation.total} 处问题：{validation}'
+                           f'\n⚠ 明细：{validation.path}（提交银行前请修正）') + skipped
             self.display_status(
-                f'✅ {success_msg}（{now}）\n文件路径：{out_path}',
+                f'✅ {success_msg}（{now}）\n文件路径：{result.output}\n{result.summary()}{skipped}',
                 True
             )
-            return out_path
-        except Exception as e:
-            now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+        self.submit_job(job_func, on_done)
+
+    # 作业交给后台队列执行，主线程定时轮询进度，界面保持响应
+    # job_func(progress) 在工作线程中运行，on_done(结果) 回到主线程执行
+    def submit_job(self, job_func, on_done, unit='行'):
+        if self.job is not None:
+            messagebox.showwarning('提示', '当前页面已有作业在处理中')
+            return
+        self.job = self.controller.jobs.submit(job_func, self.page_name)
+        self.cancel_btn.config(state='normal')
+        self.progress_bar['value'] = 0
+        self.progress_label.config(text='')
+        self._wait_msg = None
+        self._unit = unit
+        self._poll_job(self.job, on_done)
+
+    def cancel_job(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.cancel_btn.config(state='disabled')
+
+    def _poll_job(self, job, on_done):
+        if not job.is_final:
+            if job.state == Job.QUEUED:
+                msg = f'排队中...（前面还有 {self.controller.jobs.position(job)} 个作业）'
+            else:
+                msg = '处理中...'
+                self.progress_bar['value'] = job.fraction()
+                eta = job.eta()
+                self.progress_label.config(
+                    text=f'{job.rows} {self._unit}  {job.rows_per_sec():,.0f} {self._unit}/秒  '
+                         f'剩余 {"--" if eta is None else f"{eta:.0f}"} 秒'
+                )
+            if msg != self._wait_msg:  # 状态变化时才重绘，避免闪烁
+                self._wait_msg = msg
+                self.display_status(msg, success=None)
+            self.after(100, self._poll_job, job, on_done)
+            return
+
+        self.job = None
+        self.cancel_btn.config(state='disabled')
+        now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if job.state == Job.DONE:
+            self.progress_bar['value'] = 1.0
+            self.progress_label.config(text=f'{job.rows} {self._unit}  用时 {job.elapsed():.1f} 秒')
+            on_done(job.result)
+        elif job.state == Job.CANCELLED:
+            self.progress_bar['value'] = 0
+            self.progress_label.config(text='')
+            self.display_status(f'⚠ 操作已取消（{now}）', success=None)
+        else:
+            self.progress_bar['value'] = 0
             self.display_status(
-                f'❌ 操作失败（{now}）\n错误：{str(e)}',
+                f'❌ 操作失败（{now}）\n错误：{str(job.error)}',
                 False
             )
-            messagebox.showerror('错误', str(e))
+            messagebox.showerror('错误', str(job.error))
 
 
 # -------------------- 1. 本行报盘 --------------------
@@ -337,6 +483,7 @@ class LocalOfferPage(_BasePage):
         self.txt_path = tk.StringVar()
         self.path_vars = [self.txt_path]
         self.build_row('选择TXT:', self.txt_path, 'txt')
+        self.xlsx_var = self.build_xlsx_option()
 
         # 按钮区布局
         self.convert_btn = tk.Button(
@@ -383,11 +530,14 @@ class LocalOfferPage(_BasePage):
             messagebox.showwarning('提示', '本行报盘.txt文件选择错误！')
             return
 
-        def job():
-            out_path = Path(self.txt_path.get()).with_name("工行本行报盘.xls")
-            # out_path = os.path.splitext(self.txt_path.get())[0] + '_报盘结果.xls'
-            LocalOffer(self.txt_path.get(), out_path)
-            return out_path
+        txt_path = self.txt_path.get()
+        suffix = '.xlsx' if self.xlsx_var.get() else '.xls'
+
+        def job(progress):
+            from utils import LocalOffer
+            out_path = Path(txt_path).with_name("工行本行报盘" + suffix)
+            # out_path = os.path.splitext(txt_path)[0] + '_报盘结果.xls'
+            return LocalOffer(txt_path, out_path, progress=progress)
 
         self.run_job(job, '本行报盘文件转换成功')
 
@@ -439,6 +589,7 @@ class LocalReplyPage(_BasePage):
         )
         self.clear_btn.pack(side='left')
         self.controller.bind_button_events(self.clear_btn)
+        self.build_diff_button()
 
         self.display_status('请选择报盘TXT和回盘Excel并点击"开始处理"', success=None)
 
@@ -453,23 +604,31 @@ class LocalReplyPage(_BasePage):
             messagebox.showwarning('提示', '本行回盘.xls文件选择错误！')
             return
 
-        out_path = Path(self.txt_report.get()).with_name("自来水本行回盘.txt")
-        # out_path = os.path.splitext(self.txt_report.get())[0] + '_回盘结果.txt'
-        mess, txt_xls, xls_txt = LocalReply(self.txt_report.get(), self.xls_reply.get(), out_path)
+        txt_report, xls_reply = self.txt_report.get(), self.xls_reply.get()
+        out_path = Path(txt_report).with_name("自来水本行回盘.txt")
+        # out_path = os.path.splitext(txt_report)[0] + '_回盘结果.txt'
 
-        self.display_status('处理中...', success=None)
-        if mess == "文件信息一致":
-            now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.display_status(
-                f'✅ 本行回盘文件转换成功（{now}）\n文件路径：{out_path}',
-                True
-            )
-        else:
+        def job(progress):
+            from utils import LocalReply
+            return LocalReply(txt_report, xls_reply, out_path, progress=progress)
+
+        def on_done(result):
+            mess, report = result.message, result.report
             now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.display_status(
-                f'❌ 操作失败（{now}）：{mess}\n❌ txt有但xls没有：{txt_xls}\n❌ xls有但txt没有：{xls_txt}',
-                False
-            )
+            if result.ok:
+                self.display_status(
+                    f'✅ 本行回盘文件转换成功（{now}）\n文件路径：{out_path}\n{result.summary()}',
+                    True
+                )
+            else:
+                self.display_status(
+                    f'❌ 操作失败（{now}）：{mess}\n❌ {report}\n差异明细：{report.path}（点击“查看差异”浏览）\n'
+                    f'{result.summary()}',
+                    False
+                )
+            self.set_diff_report(report)
+
+        self.submit_job(job, on_done)
 
 
 # -------------------- 3. 他行报盘 --------------------
@@ -483,6 +642,7 @@ class OtherOfferPage(_BasePage):
         self.txt_path = tk.StringVar()
         self.path_vars = [self.txt_path]
         self.build_row('选择TXT:', self.txt_path, 'txt')
+        self.xlsx_var = self.build_xlsx_option()
 
         # 按钮区
         self.convert_btn = tk.Button(
@@ -528,11 +688,14 @@ class OtherOfferPage(_BasePage):
             messagebox.showwarning('提示', '他行报盘.txt文件选择错误！')
             return
 
-        def job():
-            out_path = Path(self.txt_path.get()).with_name("工行他行报盘.xls")
-            # out_path = os.path.splitext(self.txt_path.get())[0] + '_报盘结果.xls'
-            OtherOffer(self.txt_path.get(), out_path)
-            return out_path
+        txt_path = self.txt_path.get()
+        suffix = '.xlsx' if self.xlsx_var.get() else '.xls'
+
+        def job(progress):
+            from utils import OtherOffer
+            out_path = Path(txt_path).with_name("工行他行报盘" + suffix)
+            # out_path = os.path.splitext(txt_path)[0] + '_报盘结果.xls'
+            return OtherOffer(txt_path, out_path, progress=progress)
 
         self.run_job(job, '他行报盘文件转换成功')
 
@@ -584,6 +747,7 @@ class OtherReplyPage(_BasePage):
         )
         self.clear_btn.pack(side='left')
         self.controller.bind_button_events(self.clear_btn)
+        self.build_diff_button()
 
         self.display_status('请选择报盘TXT和回盘Excel并点击"开始处理"', success=None)
 
@@ -598,24 +762,134 @@ class OtherReplyPage(_BasePage):
             messagebox.showwarning('提示', '他行回盘.xls文件选择错误！')
             return
 
-        out_path = Path(self.txt_path.get()).with_name("自来水他行回盘")
-        # out_path = os.path.splitext(self.txt_report.get())[0] + '_回盘结果.txt'
-        mess, txt_xls, xls_txt = OtherReply(self.txt_path.get(), self.excel_path.get(), out_path)
+        txt_path, excel_path = self.txt_path.get(), self.excel_path.get()
+        out_path = Path(txt_path).with_name("自来水他行回盘")
+        # out_path = os.path.splitext(txt_path)[0] + '_回盘结果.txt'
+
+        def job(progress):
+            from utils import OtherReply
+            return OtherReply(txt_path, excel_path, out_path, progress=progress)
 
-        self.display_status('处理中...', success=None)
-        if mess == "文件信息一致":
+        def on_done(result):
+            mess, report = result.message, result.report
             now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            self.display_status(
-                f'✅ 他行回盘文件转换成功（{now}）\n文件路径：{out_path}',
-                True
-            )
-        else:
+            if result.ok:
+                self.display_status(
+                    f'✅ 他行回盘文件转换成功（{now}）\n文件路径：{out_path}\n{result.summary()}',
+                    True
+                )
+            else:
+                self.display_status(
+                    f'❌ 操作失败（{now}）：{mess}\n❌ {report}\n差异明细：{report.path}（点击“查看差异”浏览）\n'
+                    f'{result.summary()}',
+                    False
+                )
+            self.set_diff_report(report)
+
+        self.submit_job(job, on_done)
+
+
+# -------------------- 5. 批量处理 --------------------
+class BatchPage(_BasePage):
+    page_name = '批量处理'
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        self.title_label.config(text='文件夹内全部报盘/回盘 → 批量结果')
+
+        self.folder_path = tk.StringVar()
+        self.path_vars = [self.folder_path]
+        self.build_row('选择文件夹:', self.folder_path, 'folder')
+
+        # 按钮区
+        self.process_btn = tk.Button(
+            self.btn_frame,
+            text='开始处理',
+            width=15,
+            height=1,
+            font=('Microsoft YaHei', 10, 'bold'),
+            bg=self.controller.COLORS['active_nav'],
+            fg='white',
+            relief=tk.FLAT,
+            bd=0,
+            padx=10,
+            command=self.process
+        )
+        self.process_btn.pack(side='left', padx=(120, 20))
+        self.controller.bind_button_events(self.process_btn)
+
+        self.clear_btn = tk.Button(
+            self.btn_frame,
+            text='清除记录',
+            width=15,
+            height=1,
+            font=('Microsoft YaHei', 10),
+            bg=self.controller.COLORS['btn_normal'],
+            fg=self.controller.COLORS['text'],
+            relief=tk.FLAT,
+            bd=1,
+            highlightbackground=self.controller.COLORS['border'],
+            highlightthickness=1,
+            command=self.clear_record
+        )
+        self.clear_btn.pack(side='left')
+        self.controller.bind_button_events(self.clear_btn)
+
+        self.display_status('请选择包含报盘TXT/回盘Excel的文件夹并点击"开始处理"', success=None)
+
+    def process(self):
+        folder = self.folder_path.get()
+        if not folder or not os.path.isdir(folder):
+            messagebox.showwarning('提示', '请先选择文件夹')
+            return
+
+        def job(progress):
+            from batch import run_batch
+            return run_batch(folder, progress=progress)
+
+        def on_done(result):
+            summary_path, rows = result
             now = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            failed = [r for r in rows if r['结果'] != '成功']
+            lines = [f'{r["类型"]} {Path(r["报盘文件"] or r["回盘文件"]).name}：{r["结果"]} {r["说明"]}'
+                     for r in failed]
             self.display_status(
-                f'❌ 操作失败（{now}）：{mess}\n❌ txt有但xls没有：{txt_xls}\n❌ xls有但txt没有：{xls_txt}',
-                False
+                f'{"✅" if not failed else "❌"} 批量处理完成（{now}）：'
+                f'共 {len(rows)} 个文件，{len(failed)} 个未成功\n汇总表：{summary_path}'
+                + ''.join('\n❌ ' + line for line in lines),
+                not failed
             )
 
+        self.submit_job(job, on_done, unit='个文件')
+
+
+# -------------------- 启动计时 --------------------
+# 设置环境变量 JZB_STARTUP_BENCH=<标记文件> 时，首个窗口绘制完成后追加一行 "first_window <时间戳>"；
+# 若同时设置 JZB_STARTUP_BENCH_TXT=<本行报盘txt>，再执行一次本行报盘转换并追加 "first_conversion <时间戳>"，
+# 随后退出。由 benchmark_startup.py 启动并读取，用于比较不同打包配置的冷启动时间
+def _startup_bench(app, marker):
+    def record(event):
+        with open(marker, 'a', encoding='utf-8') as f:
+            f.write(f'{event} {time.time()}\n')
+
+    def on_first_window():
+        app.update_idletasks()
+        record('first_window')
+        txt = os.environ.get('JZB_STARTUP_BENCH_TXT')
+        if txt:
+            from utils import LocalOffer
+            LocalOffer(txt, Path(marker).with_name('startup_bench.xls'))
+            record('first_conversion')
+        app.destroy()
+
+    app.after_idle(on_first_window)
+
 
 if __name__ == '__main__':
-    App().mainloop()
\ No newline at end of file
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()  # 打包后的 exe 中启动子进程需要
+    app = App()
+    if os.environ.get('JZB_STARTUP_BENCH'):
+        _startup_bench(app, os.environ['JZB_STARTUP_BENCH'])
+    app.mainloop()
\ No newline at end of file
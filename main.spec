@@ -1,5 +1,7 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# 单目录（one-dir）+ 不用 UPX：单文件 exe 每次启动都要解压到临时目录，UPX 压缩的 dll 还要再解压，
+# 是冷启动慢的主要原因。调整后用 benchmark_startup.py 对比 first_window / first_conversion。
 
 a = Analysis(
     ['main.py'],
@@ -19,16 +21,13 @@ pyz = PYZ(a.pure)
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='main',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
@@ -36,3 +35,13 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='main',
+)
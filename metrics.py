@@ -0,0 +1,121 @@
+import os
+import json
+import time
+import datetime
+import contextlib
+
+# 转换结果与运行统计：各阶段耗时、计数、未处理行，四个转换函数都返回 ConvertResult
+# 设置环境变量 JZB_METRICS_LOG=<文件> 时，每次转换结束追加一行 JSON（批量处理的子进程同样生效），
+# 生产环境中某批次变慢时可直接看出慢在哪个阶段
+
+LOG_ENV = 'JZB_METRICS_LOG'
+SKIPPED_KEEP = 1000  # 未处理行最多保留的条数（总数另计）
+
+STAGE_NAMES = {
+    'detect': '编码侦测',
+    'read': '读取',
+    'parse': '解析',
+    'reconcile': '核对',
+    'write': '写出',
+    'index': '索引',
+    'history': '历史库',
+}
+
+
+class ConvertResult:
+    def __init__(self, func, output=None, **inputs):
+        self.func = func
+        self.inputs = {k: str(v) for k, v in inputs.items()}
+        self.output = output
+        self.message = ''
+        self.report = None   # 回盘核对不一致时的差异报告（DiffReport）
+        self.validation = None  # 报盘字段校验发现问题时的校验报告（ValidationReport）
+        self.stages = {}     # 阶段 → 秒
+        self.counters = {}   # 计数 → 值
+        self.skipped = []    # 未处理行（最多 SKIPPED_KEEP 条）
+        self.elapsed = 0.0
+        self._start = time.perf_counter()
+
+    @property
+    def ok(self):
+        return self.report is None
+
+    # -------------------- 计时 --------------------
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def timed(self, iterable, name):
+        # 流水线中的阶段：累计从 iterable 取下一项所花的时间（含其上游阶段，之后用 nest 扣除）
+        clock = time.perf_counter
+        it = iter(iterable)
+        spent = 0.0
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    break
+                finally:
+                    spent += clock() - start
+                yield item
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + spent
+
+    def nest(self, *names):
+        # 由外到内逐层嵌套的阶段：把含内层的累计时间换算为各阶段自身的时间
+        inclusive = [self.stages.get(name, 0.0) for name in names]
+        for name, outer, inner in zip(names, inclusive, inclusive[1:]):
+            self.stages[name] = max(outer - inner, 0.0)
+
+    # -------------------- 计数 --------------------
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def skip(self, line):
+        self.count('rows_skipped')
+        if len(self.skipped) < SKIPPED_KEEP:
+            self.skipped.append(line)
+
+    # -------------------- 汇总 --------------------
+    def finish(self, message=''):
+        self.message = message
+        self.elapsed = time.perf_counter() - self._start
+        log_path = os.environ.get(LOG_ENV)
+        if log_path:
+            self.log(log_path)
+        return self
+
+    def to_dict(self):
+        return {
+            'time': datetime.datetime.now().isoformat(timespec='seconds'),
+            'func': self.func,
+            'inputs': self.inputs,
+            'output': None if self.output is None else str(self.output),
+            'message': self.message,
+            'ok': self.ok,
+            'report': None if self.report is None else str(self.report.path),
+            'validation': None if self.validation is None else str(self.validation.path),
+            'elapsed': round(self.elapsed, 4),
+            'stages': {name: round(sec, 4) for name, sec in self.stages.items()},
+            'counters': self.counters,
+            'skipped': self.skipped[:20],  # 日志里只带前几条示例
+        }
+
+    def log(self, path):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(self.to_dict(), ensure_ascii=False) + '\n')
+
+    def summary(self):
+        # 一行文字：各阶段耗时 + 主要计数，供界面状态栏与批量汇总表使用
+        stages = '，'.join(f'{STAGE_NAMES.get(name, name)} {sec:.2f}s' for name, sec in self.stages.items())
+        parsed = self.counters.get('rows_parsed', 0)
+        skipped = self.counters.get('rows_skipped', 0)
+        violations = self.counters.get('violations', 0)
+        problems = f'，字段校验问题 {violations} 处' if violations else ''
+        return f'共 {self.elapsed:.2f}s（{stages}）；解析 {parsed} 行，跳过 {skipped} 行{problems}'
@@ -0,0 +1,81 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_EVEN
+
+# 金额统一用整数“分”表示：报盘 txt 中的金额本身就是以分为单位的数字串，
+# 回盘 Excel 中的金额是以元（或布局声明的其他单位）为单位的数值或文本。比较、累加都在整数上进行，
+# 只在写出时格式化为该单位的小数，不经过浮点数的解析、舍入与格式化
+
+YUAN = 100  # 1 元 = 100 分
+AMOUNT_DECIMALS = {1: 0, 10: 1, YUAN: 2}  # Excel 金额的单位（每单位的分数：分、角、元）→ 小数位数
+
+
+def parse_cents(text):
+    # 报盘 txt 金额（单位：分，str 或 bytes）→ 整数分
+    # 纯数字走快速路径；其余按十进制精确解析，四舍六入五成双到整分
+    if text.isdigit() and text.isascii():
+        return int(text)
+    if isinstance(text, bytes):
+        text = text.decode('ascii', 'replace')
+    try:
+        value = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"金额格式错误：{text!r}")
+    if not value.is_finite():
+        raise ValueError(f"金额格式错误：{text!r}")
+    return int(value.to_integral_value(ROUND_HALF_EVEN))
+
+
+def cents_from_units(value, scale=YUAN):
+    # 回盘 Excel 金额（每单位 scale 分，默认为元；不带小数的元同样按元）→ 整数分
+    # xlrd 给出的数值是 float：金额小于 1 亿元时 value * scale 的误差远小于 0.5 分，四舍五入即为精确值
+    if isinstance(value, float):
+        return round(value * scale)
+    if isinstance(value, int):
+        return value * scale
+    text = str(value).strip()
+    try:
+        cents = Decimal(text) * scale
+    except InvalidOperation:
+        raise ValueError(f"金额格式错误：{text!r}")
+    if not cents.is_finite():
+        raise ValueError(f"金额格式错误：{text!r}")
+    return int(cents.to_integral_value(ROUND_HALF_EVEN))
+
+
+def format_cents(cents):
+    # 整数分 → 两位小数的元，如 12345 → '123.45'
+    if cents < 0:
+        return '-' + format_cents(-cents)
+    return f'{cents // 100}.{cents % 100:02d}'
+
+
+def format_units(cents, scale=YUAN):
+    # 整数分 → 每单位 scale 分的金额文本，小数位数见 AMOUNT_DECIMALS：元 12345 → '123.45'，分 12345 → '12345'
+    if scale == YUAN:
+        return format_cents(cents)
+    if cents < 0:
+        return '-' + format_units(-cents, scale)
+    decimals = AMOUNT_DECIMALS[scale]
+    if not decimals:
+        return str(cents)
+    return f'{cents // scale}.{cents % scale:0{decimals}d}'
+
+
+class CentsTotal:
+    # 批次合计：笔数与整数分累加，不受浮点误差影响
+    __slots__ = ('count', 'cents')
+
+    def __init__(self):
+        self.count = 0
+        self.cents = 0
+
+    def add(self, cents):
+        self.count += 1
+        self.cents += cents
+
+    def merge(self, other):
+        # 并入另一份合计（如并行解析各块的合计）
+        self.count += other.count
+        self.cents += other.cents
+
+    def __str__(self):
+        return f'{self.count} 笔，合计 {format_cents(self.cents)} 元'
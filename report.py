@@ -0,0 +1,152 @@
+import csv
+import itertools
+from pathlib import Path
+
+# 回盘核对差异报告：差异边核对边逐条写入 CSV（带 BOM，Excel 直接打开不乱码），
+# 内存中只保留各类差异的条数，差异再多也不会在内存里排序、拼接
+
+TXT_ONLY = 'txt有但xls没有'
+XLS_ONLY = 'xls有但txt没有'
+COUNT_MISMATCH = '笔数不一致'       # 两边都有，但重复笔数不同
+FLAG_CONFLICT = '回盘处理标志冲突'  # xls 中同一 key 重复出现且处理标志不同
+KINDS = (TXT_ONLY, XLS_ONLY, COUNT_MISMATCH, FLAG_CONFLICT)
+
+
+def report_path(txt_reply_path):
+    # 差异报告与回盘 txt 放在同一目录：自来水本行回盘.txt → 自来水本行回盘_差异.csv
+    path = Path(txt_reply_path)
+    return path.with_name(path.stem + '_差异.csv')
+
+
+def create_report(path):
+    # 新建报告文件（带 BOM，Excel 直接打开不乱码），返回 (实际路径, 文件)
+    # 同名报告正被 Excel 打开（Windows 下被锁定、无法覆盖）时改写到带序号的新文件：x_差异(2).csv、x_差异(3).csv…
+    path = Path(path)
+    try:
+        return path, open(path, 'w', encoding='utf-8-sig', newline='')
+    except PermissionError:
+        for n in itertools.count(2):
+            alt = path.with_name(f'{path.stem}({n}){path.suffix}')
+            try:
+                return alt, open(alt, 'x', encoding='utf-8-sig', newline='')
+            except FileExistsError:
+                continue  # 之前留下的（可能同样被打开），换下一个序号；目录不可写时的 PermissionError 照常抛出
+
+
+def remove_stale(path):
+    # 删除上次留下的报告；报告正被 Excel 或差异窗口打开（Windows 下无法删除）时保留，不影响本次转换
+    try:
+        Path(path).unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def _rows_from(f, pos):
+    # 从二进制文件 f 的当前位置（偏移 pos）逐条解析 CSV，产出 (偏移, 行)；字段含换行时一条跨多行
+    def lines():
+        nonlocal pos
+        for line in iter(f.readline, b''):
+            pos += len(line)
+            yield line.decode('utf-8-sig')
+
+    reader = csv.reader(lines())
+    while True:
+        start = pos
+        row = next(reader, None)
+        if row is None:
+            return
+        yield start, row
+
+
+class DiffReport:
+    def __init__(self, path, key_names):
+        self.path = Path(path)
+        self.fields = ['差异类型', *key_names, '报盘txt笔数', '回盘xls笔数']
+        self.counts = dict.fromkeys(KINDS, 0)
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        self.path, self._file = create_report(self.path)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(self.fields)
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+        self._file = self._writer = None
+
+    def add(self, kind, key, txt_count, xls_count):
+        self._writer.writerow([kind, *key, txt_count, xls_count])
+        self.counts[kind] += 1
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def iter_rows(self, offset=None):
+        # 从磁盘逐条读回差异（不含表头），产出 (该条在报告中的字节偏移, 行)，供界面分页浏览、搜索
+        # offset 为之前产出的某条的偏移时从该条开始读；界面只记偏移，不把差异留在内存里
+        with open(self.path, 'rb') as f:
+            f.seek(offset or 0)
+            rows = _rows_from(f, offset or 0)
+            if offset is None:
+                next(rows, None)
+            yield from rows
+
+    def rows_at(self, offsets):
+        # 按 iter_rows 产出的偏移读回这几条差异
+        with open(self.path, 'rb') as f:
+            rows = []
+            for offset in offsets:
+                f.seek(offset)
+                rows.append(next(_rows_from(f, offset))[1])
+            return rows
+
+    def __str__(self):
+        return '，'.join(f'{kind} {n} 条' for kind, n in self.counts.items() if n)
+
+
+def validation_path(excel_path):
+    # 校验报告与报盘 Excel 放在同一目录：工行本行报盘.xlsx → 工行本行报盘_校验.csv
+    path = Path(excel_path)
+    return path.with_name(path.stem + '_校验.csv')
+
+
+class ValidationReport:
+    # 报盘字段校验报告：发现第一处问题时才创建文件，之后逐条写入；没有问题时删除上次留下的报告
+    FIELDS = ['行号', '问题', '字段', '内容']
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.counts = {}  # 问题 → 条数（按首次出现的顺序）
+        self._file = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # 转换失败时删除写了一半的报告（连同上次留下的），免得误以为是本次的完整结果
+        if self._file is not None:
+            self._file.close()
+            self._file = self._writer = None
+            if exc_type is not None:
+                remove_stale(self.path)
+        else:
+            remove_stale(self.path)
+
+    def add(self, line_num, kind, field, value):
+        if self._writer is None:
+            self.path, self._file = create_report(self.path)
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.FIELDS)
+        self._writer.writerow([line_num, kind, field, value])
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def __str__(self):
+        return '，'.join(f'{kind} {n} 处' for kind, n in self.counts.items())
@@ -0,0 +1,20 @@
+import batch
+
+# 批量扫描：同一前缀同时有 .xls 与 .xlsx 回盘时只生成一个任务（两者输出路径相同），执行时记为失败
+
+
+def test_duplicate_reply_formats_conflict(tmp_path, monkeypatch):
+    monkeypatch.setenv('JZB_HISTORY_DB', 'off')
+    monkeypatch.setenv('JZB_CACHE_DIR', 'off')
+    for name in ('A本行报盘.txt', 'A本行回盘.xls', 'A本行回盘.xlsx', 'B本行回盘.xlsx'):
+        (tmp_path / name).write_bytes(b'')
+    out = tmp_path / 'out'
+    replies = [task for task in batch.discover(tmp_path, out) if task.kind == '本行回盘']
+    assert [(t.xls_path.name, t.out_path) for t in replies] == [
+        ('A本行回盘.xls', out / 'A' / '自来水本行回盘.txt'),
+        ('B本行回盘.xlsx', out / 'B' / '自来水本行回盘.txt')]
+    row = batch.run_task(replies[0])
+    assert row['结果'] == '失败'
+    assert row['说明'] == '同时存在 A本行回盘.xls 与 A本行回盘.xlsx，请只保留其中一份回盘'
+    assert replies[1].error is None
+    assert not (out / 'A').exists()
@@ -0,0 +1,43 @@
+import json
+import threading
+
+import pytest
+
+import cli
+import watch
+
+# 命令行入口：监控模式每处理完一个文件输出一行 JSON 到标准输出，转换函数的提示信息只进标准错误
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch):
+    monkeypatch.setenv('JZB_HISTORY_DB', 'off')
+    monkeypatch.setenv('JZB_CACHE_DIR', 'off')
+
+
+def test_watch_prints_results_to_stdout(tmp_path, monkeypatch, capsys):
+    inbox = tmp_path / 'inbox'
+    inbox.mkdir()
+    (inbox / '自来水他行报盘.txt').write_bytes(
+        'SSS00201  1  BK102100099996  6217000012345678  王伟  1  100  AG1  0001  Y\r\n'.encode('gbk'))
+
+    # 第一个文件处理完即停止监控
+    stop = threading.Event()
+    record, run = watch.Watcher._record, watch.Watcher.run
+
+    def _record(self, row):
+        record(self, row)
+        stop.set()
+
+    monkeypatch.setattr(watch.Watcher, '_record', _record)
+    monkeypatch.setattr(watch.Watcher, 'run', lambda self: run(self, stop))
+
+    code = cli.main(['watch', str(inbox), '-w', '1', '--interval', '0.05', '--settle', '0'])
+    out, err = capsys.readouterr()
+    assert code == cli.EXIT_OK
+    lines = out.splitlines()
+    row = json.loads(lines[0])
+    assert row['类型'] == '他行报盘' and row['结果'] == '成功'
+    assert json.loads('\n'.join(lines[1:])) == {'status': 'ok', 'processed': 1,
+                                                 'outbox': str(inbox / '监控结果')}
+    assert '开始监控' in err and '"结果"' not in err
@@ -0,0 +1,22 @@
+from encoding import SCAN_LIMIT, detect_encoding
+
+# 编码侦测：中文出现在超过侦测前缀长度的纯 ASCII 内容之后时，仍按其后的内容判断 UTF-8/GBK
+
+
+def _offer(path, enc, ascii_lines):
+    head = ''.join(f'JZ00201   {i}   A1   6222{i:015d}   Li   1   100   000   0001   X\r\n'
+                   for i in range(ascii_lines))
+    path.write_bytes((head + 'JZ00201   0   A1   6222   王伟   1   100   000   0002   X\r\n').encode(enc))
+    return path
+
+
+def test_non_ascii_after_long_ascii_prefix(tmp_path):
+    lines = SCAN_LIMIT // 60 * 3
+    assert detect_encoding(_offer(tmp_path / 'u.txt', 'utf-8', lines)) == 'utf-8'
+    assert detect_encoding(_offer(tmp_path / 'g.txt', 'gbk', lines)) == 'gbk'
+
+
+def test_pure_ascii_uses_default(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'JZ00201 1 A1 6222 Li 1 100 000 0001 X\r\n' * 5000)
+    assert detect_encoding(path) == 'gbk'
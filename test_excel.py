@@ -0,0 +1,108 @@
+import random
+
+import pytest
+
+from excel import _scan_xls_cells, iter_rows
+
+# 回盘 .xls 按列投影扫描单元格记录（_scan_xls_cells）与 xlrd 整表加载的取值一致：
+# xlwt 随机生成的工作簿含空行、缺失的单元格、只有格式的空单元格（BLANK/MULBLANK）、文本（LABELSST）、
+# 整数与两位小数（RK，相邻的合成 MULRK）、长卡号与多位小数（NUMBER）；布尔值与公式放在不取的列里，
+# 不影响扫描，但计入行数；取的列里出现公式时扫描放弃，iter_rows 退回 xlrd 整表加载
+
+xlrd = pytest.importorskip('xlrd')
+xlwt = pytest.importorskip('xlwt')
+
+SEEDS = range(8)
+COLS = (7, 0, 3, 12, 1)  # 乱序、含超出表宽的列
+ROWS = 300
+WIDTH = 10
+
+
+def _write_workbook(path, seed, formula_col):
+    rnd = random.Random(seed)
+    wb = xlwt.Workbook(encoding='utf-8')
+    ws = wb.add_sheet('sheet1')
+    for r in range(ROWS):
+        if rnd.random() < 0.1:
+            continue  # 空行
+        for c in range(WIDTH):
+            x = rnd.random()
+            if c == formula_col:
+                ws.write(r, c, xlwt.Formula(f'B{r + 1}*2'))
+            elif c == 5:
+                ws.write(r, c, rnd.random() < 0.5)  # BOOLERR
+            elif x < 0.15:
+                continue  # 缺失的单元格
+            elif x < 0.2:
+                ws.write(r, c)  # 只有格式的空单元格
+            elif x < 0.45:
+                ws.write(r, c, rnd.choice(['王伟', '天津 滨海 公司', '全部成功', '0012', ' ', 'Ｚ']))
+            elif x < 0.7:
+                ws.write(r, c, rnd.choice([0, 7, -3, 1234, rnd.randrange(10 ** 8)]))
+            elif x < 0.85:
+                ws.write(r, c, rnd.randrange(10 ** 8) / 100)
+            else:
+                ws.write(r, c, rnd.choice([6222000012345678901, 0.1234567, 1e-9, -2.5e12]))
+    ws.write(ROWS + 5, 2)  # 表尾只有格式的空单元格不计入行数
+    wb.save(str(path))
+
+
+def _xlrd_rows(path, cols, first_row):
+    sheet = xlrd.open_workbook(str(path)).sheet_by_index(0)
+    return [tuple(sheet.cell_value(r, c) if c < sheet.ncols else '' for c in cols)
+            for r in range(first_row, sheet.nrows)]
+
+
+def _scan(path, cols, first_row):
+    with open(path, 'rb') as f:
+        wb = xlrd.open_workbook(file_contents=f.read(), on_demand=True, formatting_info=False)
+    try:
+        return _scan_xls_cells(wb, cols, first_row)
+    finally:
+        wb.release_resources()
+
+
+@pytest.mark.parametrize('first_row', (0, 1))
+@pytest.mark.parametrize('seed', SEEDS)
+def test_scan_matches_xlrd(tmp_path, seed, first_row):
+    path = tmp_path / '回盘.xls'
+    _write_workbook(path, seed, formula_col=9)
+    expected = _xlrd_rows(path, COLS, first_row)
+    assert _scan(path, COLS, first_row) == expected
+    assert list(iter_rows(path, COLS, first_row)) == expected
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_formula_in_wanted_column_falls_back(tmp_path, seed):
+    path = tmp_path / '回盘.xls'
+    _write_workbook(path, seed, formula_col=3)
+    assert _scan(path, COLS, 1) is None
+    assert list(iter_rows(path, COLS, 1)) == _xlrd_rows(path, COLS, 1)
+
+
+def test_styled_blank_rows_are_skipped(tmp_path):
+    # 回盘末尾加粗的空行：.xlsx 中只有带格式的 <c>、没有取值，与 .xls 的 BLANK 记录一样不产出
+    openpyxl = pytest.importorskip('openpyxl')
+    data = [['姓名', '卡号', '金额', '备注'], ['王伟', '6222001', 12.5, '0001'], ['李娜', '6222002', 3, '0002']]
+    bold = openpyxl.styles.Font(bold=True)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in data:
+        ws.append(row)
+    for c in range(1, 5):
+        ws.cell(row=len(data) + 1, column=c).font = bold
+    wb.save(tmp_path / '回盘.xlsx')
+
+    bold_style = xlwt.easyxf('font: bold on')
+    book = xlwt.Workbook(encoding='utf-8')
+    sheet = book.add_sheet('sheet1')
+    for r, row in enumerate(data):
+        for c, value in enumerate(row):
+            sheet.write(r, c, value)
+    for c in range(4):
+        sheet.write(len(data), c, '', bold_style)
+    book.save(str(tmp_path / '回盘.xls'))
+
+    expected = [('王伟', '6222001', 12.5, '0001'), ('李娜', '6222002', 3, '0002')]
+    assert list(iter_rows(tmp_path / '回盘.xlsx', (0, 1, 2, 3))) == expected
+    assert list(iter_rows(tmp_path / '回盘.xls', (0, 1, 2, 3))) == expected
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from excel import write_rows
+from layout import FIELDS, OTHER, Layout
+from money import format_units
+
+# 布局声明：Excel 金额单位（amount_scale）贯穿报盘 Excel 的金额列、回盘 Excel 的金额换算与历史库记录；
+# 声明有误时构造即报 ValueError
+
+
+def _layout(name, **kwargs):
+    return Layout(name, FIELDS, key=OTHER.key, flag_col=OTHER.flag_col, columns=OTHER.columns,
+                  headers=OTHER.headers, sheet='sheet1', skip_mark=OTHER.skip_mark, **kwargs)
+
+
+FEN = _layout('测试-分', amount_scale=1)
+JIAO = _layout('测试-角', amount_scale=10)
+LINE = 'SSS00201  1  BK102100099996  6217000012345678  王伟  1  {}  AG1  0001  Y\n'
+
+
+@pytest.mark.parametrize('layout,text', ((OTHER, '12345.67'), (JIAO, '123456.7'), (FEN, '1234567')))
+def test_offer_amount_column_uses_scale(layout, text):
+    row, = layout.offer_rows([LINE.format(1234567)], None)
+    assert row[layout.column_of('amount')] == text
+    assert layout.offer_record(row)[3] == 1234567
+
+
+@pytest.mark.parametrize('layout,amount', ((OTHER, 12345.67), (OTHER, '12345'), (FEN, 1234567), (FEN, '1234567')))
+def test_reply_amount_uses_scale(tmp_path, layout, amount):
+    path = tmp_path / '回盘.xlsx'
+    write_rows(path, 'sheet1', list(range(11)),
+               [['王伟', '6217000012345678', '1', '', '', 'AG1', '', amount, '0001', '', '全部成功']])
+    (key, flag), = layout.reply_pairs(path)
+    cents = 1234567 if amount != '12345' else 1234500
+    assert key == ('王伟', '6217000012345678', 'AG1', cents, '0001') and flag == '全部成功'
+
+
+@pytest.mark.parametrize('scale', (1, 10, 100))
+def test_vectorized_amounts_match_format_units(scale):
+    np = pytest.importorskip('numpy')
+    import vectorized
+    rnd = random.Random(scale)
+    cents = [0, 1, 9, 10, 99, 100, 10 ** 12 - 1] + [rnd.randrange(10 ** rnd.randint(1, 12)) for _ in range(500)]
+    assert vectorized._amounts(np.array(cents, dtype=np.int64), scale) == [format_units(c, scale) for c in cents]
+
+
+def test_invalid_spec_raises_value_error():
+    with pytest.raises(ValueError):
+        _layout('测试-单位', amount_scale=1000)
+    with pytest.raises(ValueError):
+        Layout('测试-备注', 8, key=OTHER.key, flag_col=10, columns=OTHER.columns, headers=OTHER.headers,
+               sheet='sheet1')
@@ -0,0 +1,195 @@
+import contextlib
+import csv
+import io
+
+import pytest
+
+import utils
+from excel import write_rows
+from layout import LOCAL, OTHER
+from report import COUNT_MISMATCH, FLAG_CONFLICT, TXT_ONLY, XLS_ONLY, report_path
+
+# 回盘核对（_reconcile_reply）：手写的报盘 txt 与回盘 Excel
+#   · key 按多重集合比较：重复的 key 两边笔数一致才算一致，回盘中同一 key 的处理标志不同记为冲突
+#   · 一致时复制报盘 txt，在备注列前等宽写入 001/002（_patch_copy 映射输出文件原位改写）；
+#     不一致时不生成回盘 txt，差异写入 _差异.csv
+#   · 报盘旁的 .keys 索引与 txt 一致时直接载入，txt 改动后失效、重新扫描
+#   · 含 str.split() 才切开的空白（如全角空格）时退回解码切分，结果与字节切分相同
+
+LOCAL_LINES = [
+    'JZ00201   1   A1   6222000000000001   王伟   1   1250   000   0001   X',
+    'JZ00201   2   A1   6222000000000002   天津滨海公司   1   300   000   0002   X',
+    'JZ00201   3   A1   6222000000000002   天津滨海公司   1   300   000   0002   X',
+    'JZ00201   4   A1   6222   合计   1   1850   000      ',
+]
+LOCAL_REPLY = [
+    ['王伟', '6222000000000001', 12.5, '0001', '', '全部成功'],
+    ['天津滨海公司', '6222000000000002', 3, '0002', '', '部分成功'],
+    ['天津滨海公司', '6222000000000002', '3.00', '0002', '', '部分成功'],
+]
+LOCAL_PATCHED = [
+    'JZ00201   1   A1   6222000000000001   王伟   1   1250   0000010001   X',
+    'JZ00201   2   A1   6222000000000002   天津滨海公司   1   300   0000020002   X',
+    'JZ00201   3   A1   6222000000000002   天津滨海公司   1   300   0000020002   X',
+    'JZ00201   4   A1   6222   合计   1   1850   000      ',
+]
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch):
+    monkeypatch.setenv('JZB_HISTORY_DB', 'off')
+    monkeypatch.setenv('JZB_CACHE_DIR', 'off')
+
+
+def _txt(path, lines, enc='gbk'):
+    path.write_bytes(''.join(line + '\r\n' for line in lines).encode(enc))
+    return path
+
+
+def _reply(path, layout, rows):
+    write_rows(path, layout.sheet, layout.headers, iter(rows))
+    return path
+
+
+def _reconcile(func, txt, xls, out):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(str(txt), str(xls), str(out))
+
+
+def _diff_rows(out):
+    with open(report_path(out), encoding='utf-8-sig', newline='') as f:
+        header, *rows = csv.reader(f)
+    return header, sorted(rows)
+
+
+@pytest.mark.parametrize('suffix', ('.xls', '.xlsx'))
+def test_consistent_reply_patches_copy(tmp_path, suffix):
+    txt = _txt(tmp_path / '工行本行报盘.txt', LOCAL_LINES)
+    xls = _reply(tmp_path / f'工行本行回盘{suffix}', LOCAL, LOCAL_REPLY)
+    out = tmp_path / '工行本行回盘.txt'
+    report_path(out).write_text('上次的差异', encoding='utf-8')
+    result = _reconcile(utils.LocalReply, txt, xls, out)
+    assert result.message == '文件信息一致'
+    assert out.read_bytes() == ''.join(line + '\r\n' for line in LOCAL_PATCHED).encode('gbk')
+    assert txt.read_bytes() == ''.join(line + '\r\n' for line in LOCAL_LINES).encode('gbk')
+    assert result.counters['rows_parsed'] == 3
+    assert result.counters['rows_skipped'] == 1  # 汇总行
+    assert result.counters['rows_patched'] == 3
+    assert not report_path(out).exists()
+
+
+def test_other_reply(tmp_path):
+    lines = ['SSS00201   1   BK102100099996   6222000000000003   李娜   2   500   AG7   0007   X',
+             'SSS00201   2   BK102100099996   6222000000000004   Li   2   99   AG8   0008   X',
+             '天津泰达津联自来水有限公司   599']
+    rows = [['李娜', '6222000000000003', '2', '102100099996', '00201', 'AG7', '', 5, '0007', '', '全部成功'],
+            ['Li', '6222000000000004', '2', '102100099996', '00201', 'AG8', '', 0.99, '0008', '', '失败']]
+    txt = _txt(tmp_path / '他行报盘.txt', lines)
+    out = tmp_path / '他行回盘.txt'
+    result = _reconcile(utils.OtherReply, txt, _reply(tmp_path / '他行回盘.xls', OTHER, rows), out)
+    assert result.message == '文件信息一致'
+    assert out.read_bytes().decode('gbk').splitlines() == [
+        'SSS00201   1   BK102100099996   6222000000000003   李娜   2   500   AG70010007   X',
+        'SSS00201   2   BK102100099996   6222000000000004   Li   2   99   AG80020008   X',
+        '天津泰达津联自来水有限公司   599']
+
+
+def test_count_mismatch(tmp_path):
+    # 回盘少了一笔重复的 key：集合相同，但笔数不同
+    txt = _txt(tmp_path / '报盘.txt', LOCAL_LINES)
+    xls = _reply(tmp_path / '回盘.xlsx', LOCAL, LOCAL_REPLY[:2])
+    out = tmp_path / '回盘.txt'
+    result = _reconcile(utils.LocalReply, txt, xls, out)
+    assert result.message == '报盘txt与回盘xls信息不一致'
+    assert not out.exists()
+    assert result.report.path == report_path(out)
+    header, rows = _diff_rows(out)
+    assert header == ['差异类型', '姓名', '卡号', '金额(分)', '备注', '报盘txt笔数', '回盘xls笔数']
+    assert rows == [[COUNT_MISMATCH, '天津滨海公司', '6222000000000002', '300', '0002', '2', '1']]
+    assert result.counters['diff_rows'] == 1
+
+
+def test_flag_conflict(tmp_path):
+    # 笔数一致，但回盘中同一 key 的两笔处理标志不同
+    reply = [LOCAL_REPLY[0], LOCAL_REPLY[1], LOCAL_REPLY[2][:5] + ['全部成功']]
+    txt = _txt(tmp_path / '报盘.txt', LOCAL_LINES)
+    out = tmp_path / '回盘.txt'
+    result = _reconcile(utils.LocalReply, txt, _reply(tmp_path / '回盘.xlsx', LOCAL, reply), out)
+    assert not out.exists()
+    assert _diff_rows(out)[1] == [[FLAG_CONFLICT, '天津滨海公司', '6222000000000002', '300', '0002', '2', '2']]
+    assert result.report.counts[FLAG_CONFLICT] == 1
+
+
+def test_missing_on_either_side(tmp_path):
+    # 金额不同即为不同的 key：两边各多出一笔；前导零不影响金额比较
+    lines = LOCAL_LINES[:1] + ['JZ00201   5   A1   6222000000000005   李娜   1   0800   000   0005   X'] + LOCAL_LINES[1:]
+    reply = [LOCAL_REPLY[0][:2] + [12.51] + LOCAL_REPLY[0][3:],
+             ['李娜', '6222000000000005', 8, '0005', '', '全部成功'], *LOCAL_REPLY[1:]]
+    txt = _txt(tmp_path / '报盘.txt', lines)
+    out = tmp_path / '回盘.txt'
+    result = _reconcile(utils.LocalReply, txt, _reply(tmp_path / '回盘.xlsx', LOCAL, reply), out)
+    assert _diff_rows(out)[1] == [[TXT_ONLY, '王伟', '6222000000000001', '1250', '0001', '1', '0'],
+                                  [XLS_ONLY, '王伟', '6222000000000001', '1251', '0001', '0', '1']]
+    assert str(result.report) == f'{TXT_ONLY} 1 条，{XLS_ONLY} 1 条'
+
+
+def test_index_reused_until_txt_changes(tmp_path):
+    txt = _txt(tmp_path / '报盘.txt', LOCAL_LINES)
+    xls = _reply(tmp_path / '回盘.xlsx', LOCAL, LOCAL_REPLY)
+    out = tmp_path / '回盘.txt'
+    assert utils.write_index(txt, 'gbk', LOCAL)
+    assert utils.index_path(txt).exists()
+    result = _reconcile(utils.LocalReply, txt, xls, out)
+    assert result.counters['index_hit'] == 1
+    assert result.message == '文件信息一致'
+    assert out.read_bytes() == ''.join(line + '\r\n' for line in LOCAL_PATCHED).encode('gbk')
+
+    # 大小不变、内容改动（备注 0001 → 0009）：索引失效，重新扫描得到新的 key
+    _txt(txt, [LOCAL_LINES[0].replace('000   0001', '000   0009'), *LOCAL_LINES[1:]])
+    out.unlink()
+    result = _reconcile(utils.LocalReply, txt, xls, out)
+    assert 'index_hit' not in result.counters
+    assert _diff_rows(out)[1] == [[TXT_ONLY, '王伟', '6222000000000001', '1250', '0009', '1', '0'],
+                                  [XLS_ONLY, '王伟', '6222000000000001', '1250', '0001', '0', '1']]
+
+
+def test_offer_writes_index(tmp_path):
+    # 报盘解析时顺带扫描的索引与回盘时整文件扫描的结果相同
+    txt = _txt(tmp_path / '报盘.txt', LOCAL_LINES)
+    with contextlib.redirect_stdout(io.StringIO()):
+        utils.LocalOffer(str(txt), str(tmp_path / '报盘.xlsx'))
+    with utils._map_file(txt) as data:
+        assert utils._load_index(txt, data, 'gbk', LOCAL) == utils._scan_report_txt(data, 'gbk', LOCAL)
+    result = _reconcile(utils.LocalReply, txt, _reply(tmp_path / '回盘.xlsx', LOCAL, LOCAL_REPLY),
+                        tmp_path / '回盘.txt')
+    assert result.counters['index_hit'] == 1
+
+
+@pytest.mark.parametrize('enc', ('gbk', 'utf-8'))
+def test_decoded_split_matches_byte_split(tmp_path, enc):
+    # 汇总行里的全角空格只有解码后才是分隔符：整份文件退回解码切分，key 与回写位置不变
+    plain = _txt(tmp_path / '报盘.txt', LOCAL_LINES, enc)
+    spaced = _txt(tmp_path / '全角报盘.txt', LOCAL_LINES[:3] + ['JZ00201　4　A1　6222　合计　1　1850　000'], enc)
+    with utils._map_file(plain) as data:
+        assert utils._scan_report_txt(data, enc, LOCAL)[4] is True
+    with utils._map_file(spaced) as data:
+        assert utils._scan_report_txt(data, enc, LOCAL)[4] is False
+    xls = _reply(tmp_path / '回盘.xlsx', LOCAL, LOCAL_REPLY)
+    for txt in (plain, spaced):
+        out = txt.with_name(txt.stem + '_回盘.txt')
+        result = _reconcile(utils.LocalReply, txt, xls, out)
+        assert result.message == '文件信息一致'
+        assert out.read_bytes().decode(enc).splitlines()[:3] == LOCAL_PATCHED[:3]
+
+
+def test_patch_in_place_and_wider_edits(tmp_path):
+    # 输出即报盘 txt 时不复制、直接原位改写；替换内容宽度不同时退回按段拼接
+    txt = _txt(tmp_path / '报盘.txt', LOCAL_LINES)
+    data = txt.read_bytes()
+    start = data.index(b'0001')
+    utils._patch_copy(txt, [(start - 3, 3, b'001')], txt)
+    assert txt.read_bytes() == data[:start - 3] + b'001' + data[start:]
+    out = tmp_path / '回盘.txt'
+    utils._write_reply_txt(txt, data, [(start - 3, 3, b'-'), (start, 4, b'00001')], out)
+    assert out.read_bytes() == data[:start - 3] + b'-00001' + data[start + 4:]
+    assert not (tmp_path / '回盘.txt.tmp').exists()
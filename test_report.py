@@ -0,0 +1,64 @@
+import builtins
+import contextlib
+import io
+
+import pytest
+
+import utils
+from report import TXT_ONLY, DiffReport, ValidationReport, validation_path
+
+# 差异报告正被 Excel 打开时（Windows 下文件被锁定，覆盖写入抛出 PermissionError），
+# 改写到带序号的新文件，而不是让整个转换失败；转换中途失败时不留下写了一半的校验报告
+
+
+@pytest.fixture
+def locked(monkeypatch):
+    # 模拟 Windows 下被 Excel 打开的文件：以写方式打开时抛出 PermissionError
+    paths = set()
+    real_open = builtins.open
+
+    def fake_open(file, mode='r', *args, **kwargs):
+        if str(file) in paths and ('w' in mode or 'x' in mode):
+            raise PermissionError(13, 'Permission denied', str(file))
+        return real_open(file, mode, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, 'open', fake_open)
+    return lambda path: paths.add(str(path))
+
+
+def test_diff_report_falls_back_when_locked(tmp_path, locked):
+    path = tmp_path / '自来水本行回盘_差异.csv'
+    path.write_text('上次的报告', encoding='utf-8')
+    (tmp_path / '自来水本行回盘_差异(2).csv').write_text('更早的报告', encoding='utf-8')
+    locked(path)
+    with DiffReport(path, ['卡号', '金额']) as report:
+        report.add(TXT_ONLY, ('6222001', '12.50'), 1, 0)
+    assert report.path == tmp_path / '自来水本行回盘_差异(3).csv'
+    assert [row for _, row in report.iter_rows()] == [[TXT_ONLY, '6222001', '12.50', '1', '0']]
+    assert path.read_text(encoding='utf-8') == '上次的报告'
+    assert (tmp_path / '自来水本行回盘_差异(2).csv').read_text(encoding='utf-8') == '更早的报告'
+
+
+def test_validation_report_falls_back_when_locked(tmp_path, locked):
+    path = tmp_path / '工行本行报盘_校验.csv'
+    locked(path)
+    with ValidationReport(path) as validation:
+        validation.add(3, '姓名超过60字节', '姓名', 'X' * 61)
+    assert validation.path == tmp_path / '工行本行报盘_校验(2).csv'
+    assert validation.total == 1
+
+
+def test_failed_offer_removes_partial_validation_report(tmp_path, monkeypatch):
+    # 开头几行的字段问题已写入校验报告，之后遇到无法解码的行、转换失败：不留下写了一半的报告
+    monkeypatch.setenv('JZB_HISTORY_DB', 'off')
+    monkeypatch.setenv('JZB_CACHE_DIR', 'off')
+    line = 'JZ00201   {}   A1   6222000012345678   {}   1   100   000   0001   X\r\n'
+    data = line.format(0, '王' * 31).encode('gbk')
+    data += b''.join(line.format(i, '王伟').encode('gbk') for i in range(1, 3000))
+    data += b'JZ00201   3000   A1   6222   \xff\xff   1   100   000   0001   X\r\n' + line.format(0, '合计').encode('gbk')
+    txt = tmp_path / '工行本行报盘.txt'
+    txt.write_bytes(data)
+    excel = tmp_path / '工行本行报盘.xlsx'
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(ValueError):
+        utils.LocalOffer(str(txt), str(excel))
+    assert not validation_path(excel).exists()
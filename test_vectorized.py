@@ -0,0 +1,83 @@
+import io
+import random
+import contextlib
+
+import pytest
+
+import utils
+from excel import iter_rows
+from report import validation_path
+
+# 向量化解析（engine='numpy'）与逐行解析的等价性：随机生成的报盘 txt（规整行、含空格的公司名、汇总行、空行、
+# 全角数字、超长金额、\r\n 换行、BOM 等混杂）分别用两种方式转换，输出 Excel、未处理行、计数与字段校验报告须完全一致
+# 块大小改小，使每个文件都切成多块，覆盖块边界、块内不规整行的插回与最后一块去掉汇总行
+
+pytest.importorskip('numpy')
+
+SEEDS = range(12)
+ENCODINGS = (('gbk', False), ('utf-8', False), ('utf-8', True))  # (编码, 是否带 BOM)
+LINES = 1500
+
+
+def _fuzz_offer(seed, enc, bom):
+    rnd = random.Random(seed)
+
+    def token():
+        return rnd.choice(['A1', '12', '0', '00201', 'SSS00201', 'BK102100099996', '王伟', '天津 公司', '１２', 'x\ty',
+                           '12.5', '1234567890123', '99999999999999', '0001', '-5', 'abc', 'Ｚ', '甲乙丙丁戊己', ''])
+
+    lines = []
+    for i in range(LINES):
+        r = rnd.random()
+        if r < 0.6:
+            fields = [rnd.choice(['JZ00201', 'SSS00201', '甲00201', '01']), str(i),
+                      rnd.choice(['A123', 'BK102100099996', 'BK1', '行号号号号号号号号号号号号']),
+                      rnd.choice([f'6222{rnd.randrange(10 ** 12)}', '123', '9' * 31]),
+                      rnd.choice(['王伟', 'Li', '张三丰', '天津泰达津联自来水有限公司', '李' * 31, 'X' * 61]),
+                      rnd.choice('12'),
+                      rnd.choice([str(rnd.randrange(10 ** 9)), '0012', '12.5', '1234567890123', '10000000000',
+                                  'abc', '１２']),
+                      f'AG{i}', rnd.choice([f'{rnd.randrange(10000):04d}', '备注超长超长超长', 'ABCDEFGHIJKLM']), 'X']
+            sep = rnd.choice(['   ', '  ', ' ', '\t', ' \t '])
+            line = rnd.choice(['', ' ', '\t']) + sep.join(fields) + rnd.choice(['', ' ', '  '])
+        elif r < 0.8:
+            line = ' '.join(token() for _ in range(rnd.randint(0, 13)))
+        elif r < 0.85:
+            line = ''
+        else:
+            line = '  '.join(['JZ00201', str(i), 'A1', '6222', '天津 滨海 公司', '1', '100', '000', '1234', 'x'])
+        lines.append(line)
+    newline = rnd.choice(['\r\n', '\n'])
+    data = (newline.join(lines) + rnd.choice([newline, ''])).encode(enc, errors='ignore')
+    return b'\xef\xbb\xbf' + data if bom else data
+
+
+def _convert(func, txt_path, excel_path, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            result = func(txt_path, excel_path, **kwargs)
+        except Exception as e:
+            return repr(e)
+    report = validation_path(excel_path)
+    counters = {k: v for k, v in result.counters.items() if k != 'chunks'}
+    return (list(iter_rows(excel_path, tuple(range(11)), 0)), result.skipped, counters,
+            report.read_text('utf-8-sig') if report.exists() else None)
+
+
+@pytest.fixture(autouse=True)
+def _isolated(monkeypatch):
+    monkeypatch.setenv('JZB_HISTORY_DB', 'off')
+    monkeypatch.setenv('JZB_CACHE_DIR', 'off')
+    monkeypatch.setattr(utils, 'PARALLEL_CHUNK_BYTES', 4096)
+
+
+@pytest.mark.parametrize('enc,bom', ENCODINGS)
+@pytest.mark.parametrize('seed', SEEDS)
+def test_numpy_engine_matches_scalar(tmp_path, seed, enc, bom):
+    data = _fuzz_offer(seed, enc, bom)
+    for func, name in ((utils.LocalOffer, '自来水本行报盘.txt'), (utils.OtherOffer, '自来水他行报盘.txt')):
+        txt_path = tmp_path / name
+        txt_path.write_bytes(data)
+        scalar = _convert(func, txt_path, tmp_path / 'scalar.xlsx')
+        numpy = _convert(func, txt_path, tmp_path / 'numpy.xlsx', engine='numpy')
+        assert numpy == scalar, func.__name__
@@ -1,333 +1,696 @@
+import io
+import codecs
+import functools
+import hashlib
+import marshal
+import contextlib
+import mmap
+import os
 import re
-import xlrd
-import xlwt
-import chardet
+import shutil
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 import warnings
+import itertools
+import cache
+import history
+import validate
+from excel import write_rows
+from encoding import detect_encoding, fragment_codec
+from layout import LOCAL, OTHER
+from metrics import ConvertResult
+from money import CentsTotal
+from report import (COUNT_MISMATCH, FLAG_CONFLICT, TXT_ONLY, XLS_ONLY, DiffReport, ValidationReport, remove_stale,
+                    report_path, validation_path)
+
+PROGRESS_EVERY = 5000  # 每处理多少行回调一次进度
+
+
+def _track_progress(lines, fobj, total, progress):
+    # 透传逐行迭代，每 PROGRESS_EVERY 行回调 progress(已读行数, 已读字节, 总字节)
+    # 回调抛出的异常（如取消作业）会直接中断处理
+    line_num = 0
+    for line_num, line in enumerate(lines, 1):
+        if line_num % PROGRESS_EVERY == 0:
+            progress(line_num, fobj.tell(), total)
+        yield line
+    progress(line_num, total, total)
+
+
+LONE_CR = re.compile(rb'\r(?!\n)')  # 文本模式下单独的 \r 也是换行，按字节逐行读取时不是
+
+
+def _offer_lines(result, txt_path, enc, errors, layout, index, progress=None):
+    # 逐行解析的行来源，产出解码后的行（计入读取），与文本模式逐行读取相同：
+    #   可按字节切分且换行都是 \r\n 或 \n 时，映射文件逐行取字节，顺带扫描回盘核对的 key（计入索引）并入 index，
+    #   再逐行增量解码；否则按文本模式逐行读取，索引在写出后整文件扫描
+    with _map_file(txt_path) as data:
+        if data and _can_split_bytes(data, enc) and LONE_CR.search(data) is None:
+            lines = iter(data.readline, b'')
+            if progress is not None:
+                lines = _track_progress(lines, data, len(data), progress)
+            lines = result.timed(layout.tap_bytes(lines, index.merge), 'index')
+            yield from result.timed(codecs.iterdecode(lines, enc, errors), 'read')
+            return
+    with open(txt_path, 'r', encoding=enc, errors=errors) as f:
+        lines = result.timed(f, 'read')
+        if progress is not None:
+            lines = _track_progress(lines, f.buffer, os.fstat(f.fileno()).st_size, progress)
+        yield from lines
+
+
+def _offer_message(result, validation):
+    # 报盘转换的结果信息；字段校验发现问题时附上各类问题的条数，校验报告记入结果
+    if not validation.total:
+        return '报盘文件转换成功'
+    result.validation = validation
+    result.count('violations', validation.total)
+    print('字段校验发现问题：', validation, validation.path)
+    return f'报盘文件转换成功，但字段校验发现 {validation.total} 处问题（{validation}），提交银行前请修正'
 
 
 # -------------------- 1. 本行报盘 --------------------
-def LocalOffer(txt_path, excel_path):
+def _iter_without_last(lines):
+    # 始终扣留一行再产出，迭代结束时扣留的最后一行（汇总行）被丢弃
+    prev = None
+    for line in lines:
+        if prev is not None:
+            yield prev
+        prev = line
+
+
+def LocalOffer(txt_path, excel_path, progress=None, workers=1, engine='scalar'):
     # 忽略xlwt的未来警告
     warnings.filterwarnings('ignore', category=FutureWarning, module='pandas')
 
-    # 读取文件，尝试多种编码
-    encodings = ['gbk', 'utf-8', 'cp936']
-    lines = []
-    for encoding in encodings:
+    # 侦测编码后只读一遍文件；逐行增量解码，解析结果逐条写入工作表（.xlsx 逐行落盘）
+    # 读取、解析、写出是一条流水线，各自取下一项的耗时分别累计后再扣除内层
+    result = ConvertResult('LocalOffer', excel_path, txt=txt_path)
+    written = None
+    # 解析的同时逐行做字段校验（见 validate），问题写入 <报盘Excel>_校验.csv
+    validation = ValidationReport(validation_path(excel_path))
+    check = validate.row_checker(LOCAL, validation.add)
+    # 回盘核对要用的 key 在解析的同一遍中顺带扫描（见 IndexScan），报盘后写成索引
+    index = IndexScan()
+    total = os.path.getsize(txt_path)
+    result.count('bytes_read', total)
+    if total > 0:
+        with result.stage('detect'):
+            encoding = detect_encoding(txt_path)
         try:
-            with open(txt_path, 'r', encoding=encoding) as f:
-                lines = f.readlines()
-            break
+            if _use_parallel(total, encoding, workers) or _use_blocks(encoding, engine):
+                # 多进程分块解析，或单进程按块向量化解析（读取计入解析），按原顺序合并后写出
+                amount_total = CentsTotal()
+                if _use_parallel(total, encoding, workers):
+                    records = _parallel_offer_rows(result, LOCAL, txt_path, encoding, 'strict', workers,
+                                                   amount_total, progress, engine, validation.add, index)
+                else:
+                    records = _block_offer_rows(result, LOCAL, txt_path, encoding, 'strict', amount_total,
+                                                progress, engine, check, index)
+                records = result.timed(records, 'parse')
+                with history.Batch(result) as batch, validation:
+                    with result.stage('write'):
+                        written = write_rows(excel_path, LOCAL.sheet, LOCAL.headers,
+                                             batch.tap(records, LOCAL.offer_record), bold_header=True)
+                    result.nest('write', 'parse', 'index')
+                    batch.commit()
+            else:
+                lines = _offer_lines(result, txt_path, encoding, 'strict', LOCAL, index, progress)
+                amount_total = CentsTotal()
+                # 排除最后一行数据（汇总行）；无法解析的行记入结果的未处理行
+                records = result.timed(
+                    LOCAL.offer_rows(_iter_without_last(lines), result.skip, amount_total, check=check), 'parse')
+                with history.Batch(result) as batch, validation:
+                    with result.stage('write'):
+                        written = write_rows(excel_path, LOCAL.sheet, LOCAL.headers,
+                                             batch.tap(records, LOCAL.offer_record), bold_header=True)
+                    result.nest('write', 'parse', 'read', 'index')
+                    batch.commit()
         except UnicodeDecodeError:
-            continue
-    if not lines:
+            written = None
+    if written is None:
         raise ValueError("无法读取文件，请检查编码或路径")
-
-    # 排除最后一行数据（汇总行）
-    if len(lines) > 0:
-        lines = lines[:-1]
-
-    data = []
-    unprocessed_lines = []
-
-    # 遍历每一行数据
-    for line_num, line in enumerate(lines, 1):
-        line = line.strip()
-        if not line:
+    result.count('rows_parsed', written)
+    result.count('amount_cents', amount_total.cents)
+    with result.stage('index'):
+        write_index(txt_path, encoding, LOCAL, index.scan)
+    print('报盘文件转换成功！', excel_path, amount_total)
+    return result.finish(_offer_message(result, validation))
+
+
+# -------------------- 报盘分块解析 --------------------
+# 超大报盘 txt 可按字节切成若干块（每块在换行符之后结束），在进程池中分块解码、解析，再按原顺序合并后写出：
+#   · 先并行统计各块行数，算出每块第一行的行号，未处理行的行号与逐行解析一致
+#   · 同时在途的块不超过 workers 的两倍，内存只随块大小增长
+# 只用于换行符不会出现在多字节字符内部的编码（与回盘的字节切分相同）；文件较小时进程开销不值得，仍逐行解析
+# engine='numpy' 时每块用 vectorized 模块整块向量化解析（单进程也按块进行），不满足前提的块仍逐行解析
+PARALLEL_MIN_BYTES = 16 * 2 ** 20  # 小于此大小的文件不并行
+PARALLEL_CHUNK_BYTES = 8 * 2 ** 20  # 每块的大致字节数
+
+
+def _use_parallel(size, enc, workers):
+    return (workers or 1) > 1 and size >= PARALLEL_MIN_BYTES and codecs.lookup(enc).name in BYTE_SPLIT_ENCODINGS
+
+
+def _use_blocks(enc, engine):
+    # 按块向量化解析同样按字节切块，UTF-16 等编码仍逐行解析
+    return engine == 'numpy' and codecs.lookup(enc).name in BYTE_SPLIT_ENCODINGS
+
+
+def _chunk_ranges(path, size, count):
+    # 切成约 count 块，返回 [(起始字节, 结束字节)]，除最后一块外都在换行符之后结束
+    bounds = [0]
+    with _map_file(path) as data:
+        for i in range(1, count):
+            pos = data.find(b'\n', max(size * i // count, bounds[-1]))
+            if pos == -1:
+                break
+            if pos + 1 < size:
+                bounds.append(pos + 1)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+
+def _read_chunk(path, start, stop):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(stop - start)
+
+
+def _count_lines(data):
+    # 与文本模式逐行读取的分行一致：\r\n、\n、\r 都算换行，末行可以没有换行符
+    lines = data.count(b'\n') + data.count(b'\r') - data.count(b'\r\n')
+    return lines + (not data.endswith((b'\n', b'\r')) if data else 0)
+
+
+def _count_chunk_lines(path, start, stop):
+    return _count_lines(_read_chunk(path, start, stop))
+
+
+def _scalar_offer_rows(layout, lines, skip, total, first_line=1, last=False, check=None):
+    # 逐行解析；last 时去掉最后一行（本行报盘等文件末尾的汇总行）
+    if last and layout.summary_last:
+        lines = _iter_without_last(lines)
+    return layout.offer_rows(lines, skip, total, first_line, check)
+
+
+def _vectorized(engine):
+    # engine='numpy' 且已安装 numpy 时返回 vectorized 模块，否则返回 None；numpy 只在选用向量化解析时才加载
+    if engine != 'numpy':
+        return None
+    import vectorized
+    return vectorized if vectorized.available() else None
+
+
+def _iter_offer_block(layout, data, enc, errors, skip, total, first_line=1, last=False, engine='scalar',
+                      check=None):
+    # 解析一块完整的行（bytes），返回可迭代的行；engine='numpy' 且块满足字节切分前提时用向量化解析，否则逐行解析
+    vectorized = _vectorized(engine)
+    if (vectorized is not None and _can_split_bytes(data, enc)
+            and data.count(b'\r') == data.count(b'\r\n')):
+        if errors == 'strict':
+            data.decode(enc)  # 与逐行解析一样，有无法解码的字节时报错
+        # 向量化解析先校验规整行、再逐行解析其余行：本块的问题按行号排序后再交给 check，顺序与逐行解析一致
+        found = [] if check is not None else None
+        block_check = None if check is None else lambda line_num, row: found.append((line_num, row))
+        scalar = lambda numbered: list(layout.numbered_offer_rows(numbered, skip, total, block_check))
+        rows = vectorized.offer_block_rows(layout, data, enc, errors, scalar, total, first_line,
+                                           last and layout.summary_last, block_check)
+        if found:
+            found.sort(key=lambda item: item[0])
+            for line_num, row in found:
+                check(line_num, row)
+        return rows
+    lines = io.StringIO(data.decode(enc, errors), newline=None)
+    return _scalar_offer_rows(layout, lines, skip, total, first_line, last, check)
+
+
+def _parse_offer_chunk(layout, path, start, stop, enc, errors, first_line, last, engine, validating=False):
+    # 在子进程中解析一块，返回 (行, 未处理行说明, 合计, 字段校验问题, 回盘核对的扫描结果)
+    # 本行报盘的最后一块去掉文件末尾的汇总行
+    skipped = []
+    problems = []
+    total = CentsTotal()
+    check = validate.row_checker(layout, lambda *problem: problems.append(problem)) if validating else None
+    data = _read_chunk(path, start, stop)
+    rows = list(_iter_offer_block(layout, data, enc, errors, skipped.append, total, first_line, last, engine, check))
+    return rows, skipped, total, problems, _scan_chunk(layout, data, enc, start)
+
+
+def _block_offer_rows(result, layout, txt_path, enc, errors, total, progress=None, engine='numpy', check=None,
+                      index=None):
+    # 单进程按块解析（向量化解析一次处理一块，内存只随块大小增长），按原顺序产出
+    # index（IndexScan）不为空时顺带逐块扫描回盘核对的 key 并入其中
+    size = os.path.getsize(txt_path)
+    ranges = _chunk_ranges(txt_path, size, -(-size // PARALLEL_CHUNK_BYTES))
+    result.count('chunks', len(ranges))
+    first_line = 1
+    with _map_file(txt_path) as data:
+        for i, (start, stop) in enumerate(ranges):
+            block = data[start:stop]
+            yield from _iter_offer_block(layout, block, enc, errors, result.skip, total, first_line,
+                                         i == len(ranges) - 1, engine, check)
+            if index is not None:
+                with result.stage('index'):
+                    index.merge(_scan_chunk(layout, block, enc, start))
+            first_line += _count_lines(block)
+            if progress is not None:
+                progress(total.count, stop, size)  # 产出的每一行都已计入 total
+
+
+def _parallel_offer_rows(result, layout, txt_path, enc, errors, workers, total, progress=None, engine='scalar',
+                         report=None, index=None):
+    # 按原顺序逐块产出解析结果，同时把各块的未处理行、合计并入 result 与 total
+    # report 不为空时各块在子进程中做字段校验，发现的问题按顺序交给 report(行号, 问题, 字段, 内容)
+    # index（IndexScan）不为空时并入各块在子进程中扫描的回盘核对 key
+    size = os.path.getsize(txt_path)
+    ranges = _chunk_ranges(txt_path, size, max(workers * 4, -(-size // PARALLEL_CHUNK_BYTES)))
+    result.count('chunks', len(ranges))
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        starts, stops = [r[0] for r in ranges], [r[1] for r in ranges]
+        counts = pool.map(_count_chunk_lines, [txt_path] * len(ranges), starts, stops)
+        firsts = list(itertools.accumulate(counts, initial=1))
+        pending = []
+        submitted = 0
+        rows_done = 0
+        for i in range(len(ranges)):
+            while submitted < len(ranges) and submitted < i + workers * 2:
+                pending.append(pool.submit(_parse_offer_chunk, layout, txt_path, starts[submitted], stops[submitted],
+                                           enc, errors, firsts[submitted], submitted == len(ranges) - 1,
+                                           engine, report is not None))
+                submitted += 1
+            rows, skipped, chunk_total, problems, scan = pending.pop(0).result()
+            for line in skipped:
+                result.skip(line)
+            for problem in problems:
+                report(*problem)
+            total.merge(chunk_total)
+            if index is not None:
+                index.merge(scan)
+            rows_done += len(rows)
+            yield from rows
+            if progress is not None:
+                progress(rows_done, stops[i], size)
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# -------------------- 回盘公共处理 --------------------
+# 报盘 txt 中参与回盘核对的列、回盘 Excel 的列见 layout 中各布局的 key
+REPLY_TAGS = {True: b'001', False: b'002'}  # 全部成功 → 001，其余 → 002
+
+
+# 这些编码的多字节字符不含 ASCII 空白字节（GBK 尾字节 ≥ 0x40，UTF-8 续字节 ≥ 0x80），
+# 可以不解码直接在字节上切分 10 列
+BYTE_SPLIT_ENCODINGS = {'ascii', 'gbk', 'gb2312', 'utf-8', 'utf-8-sig'}
+# str.split() 会切开而 bytes.split() 不会的空白字符；文件中出现时退回解码切分
+UNICODE_ONLY_SPACES = ('\x1c\x1d\x1e\x1f\x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004'
+                       '\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000')
+
+
+@functools.lru_cache(maxsize=None)
+def _unicode_spaces_pattern(codec):
+    # 各 UNICODE_ONLY_SPACES 字符在 codec 下的字节合成一个正则，整个文件只需扫描一遍
+    encoded = []
+    for ch in UNICODE_ONLY_SPACES:
+        try:
+            encoded.append(re.escape(ch.encode(codec)))
+        except UnicodeEncodeError:
             continue
-
-        # 正则表达式匹配多空格分隔的字段
-        pattern = re.compile(
-            r'^(\S+)\s+'  # 字段1：固定前缀
-            r'(\d+)\s+'  # 字段2：序号
-            r'(\S+)\s+'  # 字段3：固定码
-            r'(\S+)\s+'  # 字段4：卡号
-            r'(.+?)\s+'  # 字段5：姓名/公司名（支持含空格）
-            r'(\S+)\s+'  # 字段6：固定值1
-            r'(\S+)\s+'  # 字段7：应处理金额
-            r'(\S+)\s+'  # 字段8：中间码1
-            r'(\S*)\s*'  # 字段9：中间码2（允许后面空格数量任意）
-            r'(\S*)$'  # 字段10：备注（允许空）
-        )
-
-        match = pattern.match(line)
-        if match:
-            try:
-                card_num = match.group(4)
-                company = match.group(5).strip()
-                amount_str = match.group(7)
-                remark = match.group(9).strip()
-
-                # 处理金额：有值则保留两位小数并转为字符串，空值则记为"0.00"
-                if amount_str:
-                    # 先转换为浮点数处理，再格式化为两位小数的字符串
-                    amount_text = f"{round(float(amount_str) / 100, 2):.2f}"
-                else:
-                    amount_text = "0.00"  # 明确为字符串格式的两位小数
-
-                data.append([company, card_num, amount_text, remark, None, None])
-            except (ValueError, IndexError) as e:
-                unprocessed_lines.append(f"行{line_num}：解析错误 - {str(e)}")
+    return re.compile(b'|'.join(encoded)) if encoded else None
+
+
+def _can_split_bytes(data, enc):
+    # data 可为 bytes 或 mmap；正则总是从头搜索，与 mmap 的当前读取位置无关
+    if codecs.lookup(enc).name not in BYTE_SPLIT_ENCODINGS:
+        return False
+    pattern = _unicode_spaces_pattern(fragment_codec(enc))
+    return pattern is None or pattern.search(data) is None
+
+
+@contextlib.contextmanager
+def _map_file(path):
+    # 只读映射报盘 txt，不把整个文件读入内存；空文件无法映射，按空字节处理
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+
+def _scan_report_txt(data, enc, layout, progress=None):
+    # 单遍扫描报盘 txt（映射后的字节）：每行只切分、定位一次（扫描函数按布局生成）
+    # 返回 txt 中的 key 集合、重复 key 的笔数、可回写行的 (备注列起始偏移, key)、跳过的行数，以及 key 是否为 bytes
+    lines = iter(data.readline, b'') if data else iter(())
+    if progress is not None:
+        lines = _track_progress(lines, data, len(data), progress)
+    if _can_split_bytes(data, enc):
+        return (*layout.scan_bytes(lines), True)
+    return (*layout.scan_decoded(lines, enc), False)
+
+
+def _collect_xls(pairs):
+    # 计数收集回盘 xls 的 (key, 处理标志)：首次出现记入字典，重复出现只累计笔数，
+    # 标志与首次不同的 key 记为冲突（而不是让后一行静默覆盖前一行）
+    xls_map = {}
+    xls_dups = {}
+    conflicts = set()
+    for key, flag in pairs:
+        first = xls_map.get(key)
+        if first is None:
+            xls_map[key] = flag
         else:
-            unprocessed_lines.append(f"行{line_num}：未匹配格式")
+            xls_dups[key] = xls_dups.get(key, 1) + 1
+            if first != flag:
+                conflicts.add(key)
+    return xls_map, xls_dups, conflicts
 
-    # 直接使用xlwt创建xls文件
-    workbook = xlwt.Workbook(encoding='utf-8')
-    worksheet = workbook.add_sheet('数据')  # 直接创建工作表
 
-    # 定义格式
-    header_font = xlwt.Font()
-    header_font.bold = True
-    header_style = xlwt.XFStyle()
-    header_style.font = header_font
-    header_style.num_format_str = '@'  # 表头统一使用文本格式
-
-    # 文本格式（所有列都使用文本格式）
-    text_style = xlwt.XFStyle()
-    text_style.num_format_str = '@'  # 强制文本格式
-
-    # 表头数据
-    headers = ['姓名\n(不超过60个字节)', '卡号', '应处理金额(必须小于1亿)',
-               '备注(不超过12个字节)', '实处理金额', '处理标志']
-
-    # 写入表头
-    for col_idx, header in enumerate(headers):
-        worksheet.write(0, col_idx, header, header_style)
-
-    # 写入数据
-    for row_idx, row_data in enumerate(data, 1):  # 从1开始（跳过表头）
-        for col_idx, value in enumerate(row_data):
-            # 所有列都应用文本格式
-            cell_value = str(value) if value is not None else ''
-            worksheet.write(row_idx, col_idx, cell_value, text_style)
+def _encode_key(key, enc):
+    # xls 的 key 逐字段编码为 bytes（整数分金额不变），与字节切分得到的 txt key 直接比较
+    codec = fragment_codec(enc)
+    try:
+        return tuple([field.encode(codec) if isinstance(field, str) else field for field in key])
+    except UnicodeEncodeError:
+        return key  # 无法编码的 key 不可能出现在 txt 中，原样保留
+
+
+def _decode_key(key, enc):
+    # 差异列表中的金额仍以“分”的数字串展示
+    return tuple([field.decode(enc, 'replace') if isinstance(field, bytes) else str(field)
+                  for field in key])
+
+
+def _reply_edits(patches, xls_map):
+    # 回写改动 (偏移, 原长度, 新字节)：001/002 前缀覆盖备注列（起始偏移见扫描结果）之前等长的空白字节
+    edits = []
+    for start, key in patches:
+        flag = xls_map.get(key)
+        if flag is not None:
+            tag = REPLY_TAGS[flag == '全部成功']
+            edits.append((start - len(tag), len(tag), tag))
+    return edits
+
+
+def _patch_copy(txt_report_path, edits, txt_reply_path):
+    # 等宽改写：操作系统级整体复制源文件，再映射输出文件，只覆写记录的偏移
+    if not (os.path.exists(txt_reply_path) and os.path.samefile(txt_report_path, txt_reply_path)):
+        shutil.copyfile(txt_report_path, txt_reply_path)
+    if not edits:
+        return
+    with open(txt_reply_path, 'r+b') as f, mmap.mmap(f.fileno(), 0) as mm:
+        for offset, _, new in edits:
+            mm[offset:offset + len(new)] = new
+
+
+def _assemble_spans(data, edits, txt_reply_path):
+    # 宽度有变化时退回按段拼接：原始字节按段拷贝，在记录的偏移处换入新字节
+    # 先写临时文件再替换，输出与源文件相同时也不会截断正在读取的映射
+    tmp_path = f'{txt_reply_path}.tmp'
+    with memoryview(data) as view, open(tmp_path, 'wb') as fout:
+        pos = 0
+        for offset, old_len, new in edits:
+            fout.write(view[pos:offset])
+            fout.write(new)
+            pos = offset + old_len
+        fout.write(view[pos:])
+    os.replace(tmp_path, txt_reply_path)
+
+
+def _write_reply_txt(txt_report_path, data, edits, txt_reply_path):
+    # 回盘与报盘只差备注列前的前缀，等宽时走复制 + 原位改写，接近纯拷贝速度
+    if all(len(new) == old_len for _, old_len, new in edits):
+        _patch_copy(txt_report_path, edits, txt_reply_path)
+    else:
+        _assemble_spans(data, edits, txt_reply_path)
+
+
+# 报盘索引：报盘时顺带把回盘核对要用的扫描结果（key、重复笔数、回写偏移）写成紧凑的二进制文件，
+# 放在报盘 txt 旁边（<报盘txt>.keys）；回盘时若索引记录的内容哈希、大小、编码、核对列都与当前 txt 一致，
+# 直接载入，不再切分、解码 txt。索引缺失、损坏或过期一律重新扫描
+INDEX_SUFFIX = '.keys'
+INDEX_VERSION = 1  # 索引内容的结构变化时加一
+
+
+def index_path(txt_path):
+    txt_path = Path(txt_path)
+    return txt_path.with_name(txt_path.name + INDEX_SUFFIX)
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=20).digest()
+
+
+class IndexScan:
+    # 报盘解析时顺带得到的回盘核对扫描结果：各块（或整个文件）按原顺序并入，与整文件扫描一次的结果相同
+    # 只收字节切分的扫描结果；有一块不满足字节切分前提（并入 None）时放弃，由 write_index 整文件扫描
+    def __init__(self):
+        self.keys = set()
+        self.dups = {}
+        self.patches = []
+        self.skipped = 0
+        self.parts = 0
+        self.complete = True
+
+    def merge(self, scan):
+        if scan is None:
+            self.complete = False
+            return
+        keys, dups, patches, skipped = scan
+        common = keys & self.keys
+        for key in common:
+            self.dups[key] = self.dups.get(key, 1) + dups.get(key, 1)
+        for key, n in dups.items():
+            if key not in common:
+                self.dups[key] = n
+        self.keys |= keys
+        self.patches += patches
+        self.skipped += skipped
+        self.parts += 1
+
+    @property
+    def scan(self):
+        # 与 _scan_report_txt 的返回值相同；没有扫描或有块未能扫描时返回 None
+        if not self.complete or not self.parts:
+            return None
+        return self.keys, self.dups, self.patches, self.skipped, True
+
+
+def _scan_chunk(layout, data, enc, offset):
+    # 按字节切分扫描一块完整的行（offset 为块在文件中的起始偏移）；块中有需解码才能切分的空白时返回 None
+    if not _can_split_bytes(data, enc):
+        return None
+    return layout.scan_bytes(iter(io.BytesIO(data).readline, b''), offset)
+
+
+def write_index(txt_path, enc, layout, scan=None):
+    # 写索引失败（如目录只读）不影响报盘本身，返回是否写成
+    # scan 为报盘解析时顺带得到的扫描结果（IndexScan.scan），为空时整文件扫描一遍
+    try:
+        with _map_file(txt_path) as data:
+            if scan is None:
+                scan = _scan_report_txt(data, enc, layout)
+            payload = marshal.dumps((INDEX_VERSION, layout.key_cols, enc, len(data), _digest(data), scan))
+        path = index_path(txt_path)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+def _load_index(txt_path, data, enc, layout):
+    # 索引与当前 txt 一致时返回扫描结果，否则返回 None
+    try:
+        with open(index_path(txt_path), 'rb') as f:
+            version, cols, index_enc, size, digest, scan = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (version, cols, index_enc, size) != (INDEX_VERSION, layout.key_cols, enc, len(data)):
+        return None
+    if digest != _digest(data):
+        return None
+    return scan
+
+
+def _load_xls(result, excel_reply_path, layout):
+    # 回盘 Excel 的解析结果按内容哈希缓存：同一份回盘重复核对时不再解析 Excel
+    collected = cache.load(excel_reply_path, result.func)
+    if collected is not None:
+        result.count('xls_cache_hit')
+        return collected
+    result.count('bytes_read', os.path.getsize(excel_reply_path))
+    collected = _collect_xls(layout.reply_pairs(excel_reply_path))
+    cache.store(excel_reply_path, result.func, collected)
+    return collected
+
+
+def _rows_counted(keys, dups):
+    # 多重集合的总笔数：每个 key 计 1，重复的再补上多出的笔数
+    return len(keys) + sum(n - 1 for n in dups.values())
+
+
+def _record_reply(result, layout, xls_map, xls_dups):
+    # 回盘 xls 的每一笔（重复的按笔数）连同处理标志写入历史库
+    with history.Batch(result) as batch:
+        if not batch.enabled:
+            return
+        with result.stage('history'):
+            key_record = layout.key_record
+            for key, flag in xls_map.items():
+                record = key_record(key)
+                for _ in range(xls_dups.get(key, 1)):
+                    batch.add(*record, flag)
+        batch.commit()
+
+
+def _reconcile_reply(result, layout, txt_report_path, excel_reply_path, txt_reply_path, progress=None):
+    # 本行、他行回盘共用：报盘 txt 的 key 列、回盘 Excel 的列由 layout 给出
+    # ---------- ①. 编码侦探 ----------
+    with result.stage('detect'):
+        enc = detect_encoding(txt_report_path)
+
+    # ---------- ②③. 读回盘（或缓存）的 (key, 处理标志)，单遍收集 txt 中的 key（含重复笔数）与回写位置 ----------
+    with result.stage('read'):
+        xls_map, xls_dups, conflicts = _load_xls(result, excel_reply_path, layout)
+    result.count('xls_rows', _rows_counted(xls_map, xls_dups))
+    with _map_file(txt_report_path) as data:
+        result.count('bytes_read', len(data))
+        with result.stage('parse'):
+            scan = _load_index(txt_report_path, data, enc, layout)
+            if scan is None:
+                scan = _scan_report_txt(data, enc, layout, progress)
+            else:
+                result.count('index_hit')
+                if progress is not None:
+                    progress(_rows_counted(scan[0], scan[1]), len(data), len(data))
+            txt_keys, txt_dups, patches, skipped, byte_keys = scan
+        result.count('rows_parsed', _rows_counted(txt_keys, txt_dups))
+        result.count('rows_skipped', skipped)
+
+        # ---------- ④. 按多重集合核对：key 与每个 key 的笔数都一致，且 xls 中无标志冲突 ----------
+        reply_map, reply_dups = xls_map, xls_dups  # 写入历史库用（下面可能换成 bytes key）
+        with result.stage('reconcile'):
+            if byte_keys:
+                xls_map = {_encode_key(k, enc): flag for k, flag in xls_map.items()}
+                xls_dups = {_encode_key(k, enc): n for k, n in xls_dups.items()}
+                conflicts = {_encode_key(k, enc) for k in conflicts}
+            consistent = txt_keys == xls_map.keys() and txt_dups == xls_dups and not conflicts
+        if consistent:
+            with result.stage('write'):
+                edits = _reply_edits(patches, xls_map)
+                _write_reply_txt(txt_report_path, data, edits, txt_reply_path)
+            result.count('rows_patched', len(edits))
+
+    diff_path = report_path(txt_reply_path)
+    if consistent:
+        remove_stale(diff_path)  # 清除上次核对不一致时留下的差异报告
+        _record_reply(result, layout, reply_map, reply_dups)
+        print('回盘文件转换成功！', txt_reply_path)
+        return result.finish("文件信息一致")
+
+    # 不一致：差异边比对边写入报告文件，不在内存中汇总、排序；不再生成回盘文件
+    result.output = None
+    with result.stage('reconcile'), DiffReport(diff_path, layout.key_names) as report:
+        for key in txt_keys:
+            if key not in xls_map:
+                report.add(TXT_ONLY, _decode_key(key, enc), txt_dups.get(key, 1), 0)
+        for key in xls_map:
+            if key not in txt_keys:
+                report.add(XLS_ONLY, _decode_key(key, enc), 0, xls_dups.get(key, 1))
+        for key in txt_dups.keys() | xls_dups.keys():
+            if key in txt_keys and key in xls_map:
+                txt_count, xls_count = txt_dups.get(key, 1), xls_dups.get(key, 1)
+                if txt_count != xls_count:
+                    report.add(COUNT_MISMATCH, _decode_key(key, enc), txt_count, xls_count)
+        for key in conflicts:
+            txt_count = txt_dups.get(key, 1) if key in txt_keys else 0
+            report.add(FLAG_CONFLICT, _decode_key(key, enc), txt_count, xls_dups[key])
+    result.report = report
+    result.count('diff_rows', report.total)
+    _record_reply(result, layout, reply_map, reply_dups)
+    print('报盘txt与回盘xls信息不一致！', report, report.path)
+    return result.finish("报盘txt与回盘xls信息不一致")
 
-    # 保存文件
-    workbook.save(excel_path)
 
 # -------------------- 2. 本行回盘 --------------------
-def LocalReply(txt_report_path, excel_reply_path, txt_reply_path):
-    mess = ""
-    # ---------- ①. 读 xls 建字典 ----------
-    wb = xlrd.open_workbook(excel_reply_path)
-    sheet = wb.sheet_by_index(0)
-    xls_map = {}
-    for r in range(1, sheet.nrows):
-        row = sheet.row_values(r)
-        key = (str(row[0]).strip(),  # 姓名
-               str(row[1]).strip(),  # 卡号
-               str(int(round(float(row[2]) * 100))),  # 金额*100
-               str(row[3]).strip())  # 原备注
-        flag = str(row[5]).strip()
-        xls_map[key] = flag          # value 先保留，后面还要用
-
-    # ---------- ②. 编码侦探 ----------
-    with open(txt_report_path, 'rb') as f:
-        raw = f.read(10000)
-    enc = chardet.detect(raw)['encoding'] or 'gbk'
-
-    # ---------- ③. 收集 txt 中的 key ----------
-    txt_keys = set()
-    with open(txt_report_path, 'rb') as fin:
-        for line_b in fin:
-            line_u = line_b.decode(enc).rstrip('\r\n')
-            parts_u = line_u.split()
-            if len(parts_u) != 10:
-                continue
-            key = (parts_u[4], parts_u[3], parts_u[6], parts_u[8])
-            txt_keys.add(key)
-
-    # ---------- ④. 核对并逐行处理----------
-    # 正则：10 列，第 9 列正好是 4 位数字
-    # 分组：前面部分、第 9 列、后面部分
-    xls_keys = set(xls_map.keys())
-    if txt_keys == xls_keys:          # 集合相等：元素个数与内容完全一致
-        mess = "文件信息一致"
-        pat = re.compile(rb'^((?:\S+\s+){8})(\d{4})(\s+\S+.*)$')
-        with open(txt_report_path, 'rb') as fin, open(txt_reply_path, 'wb') as fout:
-            for line_b in fin:
-                line_u = line_b.decode(enc).rstrip('\r\n')
-                parts_u = line_u.split()
-                if len(parts_u) != 10:  # 格式不对，原样输出
-                    fout.write(line_b)
-                    continue
-
-                # 构造查询 key
-                key = (parts_u[4],  # 姓名
-                       parts_u[3],  # 卡号
-                       parts_u[6],  # 金额
-                       parts_u[8])  # 原 4 位备注
-
-                if key in xls_map:
-                    flag = xls_map[key]
-                    new_note = ('001' if flag == '全部成功' else '002') + key[3]
-
-                    # 用正则只替换第 9 列那 4 位数字，空格原样保留
-                    def repl(m):
-                        return m.group(1)[:-3] + new_note.encode(enc) + m.group(3)
-
-                    line_b = pat.sub(repl, line_b)
-
-                fout.write(line_b)
-        print('回盘文件转换成功！', txt_reply_path)
-        return mess,[],[]
-    else:
-        mess = "报盘txt与回盘xls信息不一致"
-        # 如需详细差异，可打印：
-        txt_xls = sorted(txt_keys - xls_keys, key=lambda x: (x[0], x[1]))
-        xls_txt = sorted(xls_keys - txt_keys, key=lambda x: (x[0], x[1]))
-        return mess,txt_xls,xls_txt         # 不一致可直接退出，不再生成回盘文件
+def LocalReply(txt_report_path, excel_reply_path, txt_reply_path, progress=None):
+    result = ConvertResult('LocalReply', txt_reply_path, txt=txt_report_path, excel=excel_reply_path)
+    return _reconcile_reply(result, LOCAL, txt_report_path, excel_reply_path, txt_reply_path, progress)
 
 # -------------------- 3. 他行报盘 --------------------
 
-import os  # 需导入os模块检查文件状态
-import xlwt
-
-def OtherOffer(txt_path, excel_path):
-    XLS_FIELDS = [
-        "姓名\n(不超过60个字节)", "卡号", "行别", "跨行行号", "业务种类",
-        "协议书号", "账号地址", "应处理金额(必须小于1亿)",
-        "备注(不超过12个字节)", "实处理金额", "处理标志"
-    ]
-    data = []
+def OtherOffer(txt_path, excel_path, progress=None, workers=1, engine='scalar'):
+    result = ConvertResult('OtherOffer', excel_path, txt=txt_path)
     try:
-        with open(txt_path, "r", encoding="gbk", errors="ignore") as f:
-            for line_num, line in enumerate(f.readlines(), 1):
-                line = line.rstrip("\n")
-                if "天津泰达津联自来水有限公司" in line or line.strip() == "":
-                    continue
-
-                valid_blocks = list(filter(lambda x: x.strip() != "", line.split()))
-                if len(valid_blocks) != 10:
-                    continue
-
-                biz_type = valid_blocks[0][-5:].strip() if len(valid_blocks[0]) >= 5 else "00201"
-                real_bank_code = valid_blocks[2][-12:].strip() if len(valid_blocks[2]) >= 12 else ""
-                card_no = valid_blocks[3].strip()
-                company_name = valid_blocks[4].strip()
-                bank_type = valid_blocks[5].strip() if valid_blocks[5].strip() else "1"
-
-                raw_amount = valid_blocks[6].strip()
-                if raw_amount.isdigit():
-                    real_amount = round(int(raw_amount) / 100, 2)
-                    amount_str = f"{real_amount:.2f}"
-                else:
-                    amount_str = "0.00"
-
-                agreement_no = valid_blocks[7].strip()
-                remark = valid_blocks[8].strip()
-
-                xls_row = [
-                    company_name, card_no, bank_type, real_bank_code, biz_type,
-                    agreement_no, "", amount_str, remark, "", ""
-                ]
-                data.append(xls_row)
-
-        if not data:
-            raise Exception("未从TXT文件中提取到有效数据")  # 明确无数据错误
+        with result.stage('detect'):
+            encoding = detect_encoding(txt_path)
     except Exception as e:
         raise Exception(f"读取TXT文件失败：{str(e)}")  # 抛出读取错误
 
-    try:
-        # 关键：检查文件是否已被打开（通过尝试独占写入判断）
-        if os.path.exists(excel_path):
-            try:
-                # 以独占模式打开文件，若失败则说明被占用
-                with open(excel_path, 'w', encoding='utf-8') as f:
-                    pass  # 仅测试是否可写，不实际写入内容
-            except PermissionError:
-                raise Exception(f"目标文件已被打开：\n{excel_path}\n请关闭该文件后重试")
-
-        # 创建工作簿和工作表
-        book = xlwt.Workbook(encoding='utf-8')
-        sheet = book.add_sheet('sheet1')
-
-        text_style = xlwt.XFStyle()
-        text_style.num_format_str = '@'
-
-        for col_idx, header in enumerate(XLS_FIELDS):
-            sheet.write(0, col_idx, header, text_style)
-
-        for row_idx, row_data in enumerate(data, start=1):
-            for col_idx, value in enumerate(row_data):
-                sheet.write(row_idx, col_idx, str(value) if value != "" else "", text_style)
-
-        book.save(excel_path)
-    except Exception as e:
-        raise Exception(f"生成Excel失败：{str(e)}")  # 抛出保存错误
+    # 解析的同时逐行做字段校验（见 validate），问题写入 <报盘Excel>_校验.csv
+    validation = ValidationReport(validation_path(excel_path))
+    check = validate.row_checker(OTHER, validation.add)
+    # 回盘核对要用的 key 在解析的同一遍中顺带扫描（见 IndexScan），报盘后写成索引
+    index = IndexScan()
+    with validation:
+        size = os.path.getsize(txt_path)
+        result.count('bytes_read', size)
+        amount_total = CentsTotal()
+        if _use_parallel(size, encoding, workers):
+            # 多进程分块解析（读取计入解析），按原顺序合并
+            records = result.timed(_parallel_offer_rows(
+                result, OTHER, txt_path, encoding, 'ignore', workers, amount_total, progress, engine,
+                validation.add, index), 'parse')
+            nested = ('write', 'parse')
+        elif _use_blocks(encoding, engine):
+            # 单进程按块向量化解析（读取计入解析）
+            records = result.timed(_block_offer_rows(
+                result, OTHER, txt_path, encoding, 'ignore', amount_total, progress, engine, check, index), 'parse')
+            nested = ('write', 'parse', 'index')
+        else:
+            lines = _offer_lines(result, txt_path, encoding, 'ignore', OTHER, index, progress)
+            records = result.timed(OTHER.offer_rows(lines, result.skip, amount_total, check=check), 'parse')
+            nested = ('write', 'parse', 'read', 'index')
+        try:
+            # 先取出第一条，确认有数据后再创建 Excel；其余记录边解析边写入
+            first = next(records, None)
+            if first is None:
+                raise Exception("未从TXT文件中提取到有效数据")  # 明确无数据错误
+        except Exception as e:
+            raise Exception(f"读取TXT文件失败：{str(e)}")  # 抛出读取错误
 
-    print('报盘文件转换成功！', excel_path)
+        try:
+            # 关键：检查文件是否已被打开（通过尝试独占写入判断）
+            if os.path.exists(excel_path):
+                try:
+                    # 以独占模式打开文件，若失败则说明被占用
+                    with open(excel_path, 'w', encoding='utf-8') as f_test:
+                        pass  # 仅测试是否可写，不实际写入内容
+                except PermissionError:
+                    raise Exception(f"目标文件已被打开：\n{excel_path}\n请关闭该文件后重试")
+
+            with history.Batch(result) as batch:
+                with result.stage('write'):
+                    written = write_rows(excel_path, OTHER.sheet, OTHER.headers,
+                                         batch.tap(itertools.chain([first], records), OTHER.offer_record))
+                result.nest(*nested)
+                batch.commit()
+        except Exception as e:
+            raise Exception(f"生成Excel失败：{str(e)}")  # 抛出保存错误
+
+    result.count('rows_parsed', written)
+    result.count('amount_cents', amount_total.cents)
+    with result.stage('index'):
+        write_index(txt_path, encoding, OTHER, index.scan)
+    print('报盘文件转换成功！', excel_path, amount_total)
+    return result.finish(_offer_message(result, validation))
 
 # -------------------- 4. 他行回盘 --------------------
-def OtherReply(txt_report_path, excel_reply_path,txt_reply_path):
-    mess = ""
-    # ---------- ①. 读 xls 建字典 ----------
-    wb = xlrd.open_workbook(excel_reply_path)
-    sheet = wb.sheet_by_index(0)
-    xls_map = {}
-    for r in range(1, sheet.nrows):
-        row = sheet.row_values(r)
-        key = (str(row[0]).strip(),  # 姓名
-               str(row[1]).strip(),  # 卡号
-               str(row[5]).strip(),  # 协议书号
-               str(int(round(float(row[7]) * 100))),  # 金额*100
-               str(row[8]).strip())  # 原备注
-        flag = str(row[10]).strip()
-        xls_map[key] = flag  # value 先保留，后面还要用
-
-    # ---------- ②. 编码侦探 ----------
-    with open(txt_report_path, 'rb') as f:
-        raw = f.read(10000)
-    enc = chardet.detect(raw)['encoding'] or 'gbk'
-
-    # ---------- ③. 收集 txt 中的 key ----------
-    txt_keys = set()
-    with open(txt_report_path, 'rb') as fin:
-        for line_b in fin:
-            line_u = line_b.decode(enc).rstrip('\r\n')
-            parts_u = line_u.split()
-            if len(parts_u) != 10:
-                continue
-            key = (parts_u[4], parts_u[3], parts_u[7], parts_u[6], parts_u[8])
-            txt_keys.add(key)
-
-    # ---------- ④. 核对并逐行处理----------
-    # 正则：10 列，第 9 列正好是 4 位数字
-    # 分组：前面部分、第 9 列、后面部分
-    xls_keys = set(xls_map.keys())
-    if txt_keys == xls_keys:  # 集合相等：元素个数与内容完全一致
-        mess = "文件信息一致"
-        pat = re.compile(rb'^((?:\S+\s+){8})(\d{4})(\s+\S+.*)$')
-        with open(txt_report_path, 'rb') as fin, open(txt_reply_path, 'wb') as fout:
-            for line_b in fin:
-                line_u = line_b.decode(enc).rstrip('\r\n')
-                parts_u = line_u.split()
-                if len(parts_u) != 10:  # 格式不对，原样输出
-                    fout.write(line_b)
-                    continue
-
-                # 构造查询 key
-                key = (parts_u[4],  # 姓名
-                       parts_u[3],  # 卡号
-                       parts_u[7],  # 协议书号
-                       parts_u[6],  # 金额
-                       parts_u[8])  # 原 4 位备注
-
-                if key in xls_map:
-                    flag = xls_map[key]
-                    new_note = ('001' if flag == '全部成功' else '002') + key[4]
-
-                    # 用正则只替换第 9 列那 4 位数字，空格原样保留
-                    def repl(m):
-                        return m.group(1)[:-3] + new_note.encode(enc) + m.group(3)
-
-                    line_b = pat.sub(repl, line_b)
-
-                fout.write(line_b)
-        print('回盘文件转换成功！', txt_reply_path)
-        return mess, [], []
-    else:
-        mess = "报盘txt与回盘xls信息不一致"
-        # 如需详细差异，可打印：
-        txt_xls = sorted(txt_keys - xls_keys, key=lambda x: (x[0], x[1]))
-        xls_txt = sorted(xls_keys - txt_keys, key=lambda x: (x[0], x[1]))
-        return mess, txt_xls, xls_txt  # 不一致可直接退出，不再生成回盘文件
+def OtherReply(txt_report_path, excel_reply_path, txt_reply_path, progress=None):
+    result = ConvertResult('OtherReply', txt_reply_path, txt=txt_report_path, excel=excel_reply_path)
+    return _reconcile_reply(result, OTHER, txt_report_path, excel_reply_path, txt_reply_path, progress)
@@ -0,0 +1,67 @@
+import codecs
+
+from money import format_units
+
+# 报盘字段校验：报盘 Excel 表头写明的银行限制（姓名不超过 60 个字节、金额必须小于 1 亿、备注不超过 12 个字节）
+# 与卡号格式，在解析报盘的同一遍中逐行检查，每处问题连同行号写入校验报告（不再另读一遍文件），
+# 不必等整份文件提交后被银行退回才发现
+#   · 字节数按银行系统的编码（GBK）计算，与报盘 txt 本身的编码无关；GBK 无法表示的字符本身即为问题
+#   · 校验只报告问题，不改变转换结果
+
+BANK_ENCODING = 'gbk'
+NAME_MAX_BYTES = 60
+REMARK_MAX_BYTES = 12
+AMOUNT_LIMIT_CENTS = 100_000_000 * 100  # 金额必须小于 1 亿元
+CARD_MIN_DIGITS = 10  # 卡号/账号：10–30 位数字
+CARD_MAX_DIGITS = 30
+
+NAME_TOO_LONG = '姓名超过60字节'
+REMARK_TOO_LONG = '备注超过12字节'
+NOT_ENCODABLE = '含银行编码无法表示的字符'
+AMOUNT_TOO_LARGE = '金额不小于1亿'
+AMOUNT_NEGATIVE = '金额为负数'
+CARD_MALFORMED = '卡号格式不符'
+
+_encode = codecs.getencoder(BANK_ENCODING)  # 逐行调用，免去每次按名称查找编码
+
+
+def bank_bytes(text):
+    # 按银行编码计的字节数；含无法编码的字符时返回 None
+    if text.isascii():
+        return len(text)
+    try:
+        return len(_encode(text)[0])
+    except UnicodeEncodeError:
+        return None
+
+
+def row_checker(layout, report):
+    # 按布局找到报盘 Excel 行中姓名、卡号、金额、备注所在列，返回 check(行号, 行)，供解析时逐行调用
+    # 发现问题时调用 report(行号, 问题, 字段, 内容)
+    name_at = layout.column_of('name')
+    card_at = layout.column_of('card')
+    amount_at = layout.column_of('amount')
+    remark_at = layout.column_of('remark')
+    # 金额列按布局的单位格式化：不超过上限的最长写法，如两位小数的元 99999999.99 为 11 个字符
+    amount_max_chars = len(format_units(AMOUNT_LIMIT_CENTS - 1, layout.amount_scale))
+
+    def check(line_num, row):
+        name, remark, amount, card = row[name_at], row[remark_at], row[amount_at], row[card_at]
+        size = len(name) if name.isascii() else bank_bytes(name)
+        if size is None:
+            report(line_num, NOT_ENCODABLE, '姓名', name)
+        elif size > NAME_MAX_BYTES:
+            report(line_num, NAME_TOO_LONG, '姓名', name)
+        size = len(remark) if remark.isascii() else bank_bytes(remark)
+        if size is None:
+            report(line_num, NOT_ENCODABLE, '备注', remark)
+        elif size > REMARK_MAX_BYTES:
+            report(line_num, REMARK_TOO_LONG, '备注', remark)
+        if amount[0] == '-':
+            report(line_num, AMOUNT_NEGATIVE, '金额', amount)
+        elif len(amount) > amount_max_chars:
+            report(line_num, AMOUNT_TOO_LARGE, '金额', amount)
+        if not (card.isdigit() and card.isascii() and CARD_MIN_DIGITS <= len(card) <= CARD_MAX_DIGITS):
+            report(line_num, CARD_MALFORMED, '卡号', card)
+
+    return check
@@ -0,0 +1,246 @@
+import codecs
+import itertools
+
+try:
+    import numpy as np
+except ImportError:  # numpy 是可选依赖；未安装时只能逐行解析
+    np = None
+
+import validate
+from encoding import fragment_codec
+from money import AMOUNT_DECIMALS, YUAN
+
+# 报盘的向量化解析（可选，需要 numpy）：一块字节一次性找出各行各列的起止位置，
+# 按布局（layout.Layout）声明的各列取法整列提取、转换金额与后缀等，规整的行不再逐行切分、逐字段处理
+#   · 列数不符的行（含空格的公司名、汇总行、空行、坏行等）交回逐行解析，
+#     输出顺序、未处理行说明（含行号）与逐行解析完全一致
+#   · 前提与回盘的字节切分相同：换行与空白字节不会出现在多字节字符内部，块中没有 str.split() 另认作空白的字符，
+#     也没有单独的 \r 换行；不满足时由调用方整块逐行解析
+
+MAX_AMOUNT_DIGITS = 12  # 更长的金额交回逐行解析，整列求和不会溢出 int64
+
+
+if np is not None:
+    ASCII = np.arange(256) < 0x80
+    DIGITS = (np.arange(256) >= 0x30) & (np.arange(256) <= 0x39)
+
+
+def available():
+    return np is not None
+
+
+class _Tokens:
+    # 一块字节的分行、分列结果：规整行（正好 fields 列）的各列起止位置为 (行数, fields) 的数组
+    def __init__(self, data, fields, limit=None):
+        # limit：只把前 limit 行当作候选的规整行
+        buf = np.frombuffer(data, dtype=np.uint8)
+        self.data = data
+        self.buf = np.append(buf, np.uint8(10))  # 末尾补一个换行，最后一列之后总有一个空白字节
+
+        # 各行 [起, 止)：按 \n 分行，末尾没有换行的最后一段也算一行
+        stops = np.flatnonzero(buf == 10) + 1
+        if len(buf) and buf[-1] != 10:
+            stops = np.append(stops, len(buf))
+        self.line_stops = stops
+        self.line_starts = np.concatenate(([0], stops[:-1])).astype(stops.dtype)
+        self.line_count = len(stops)
+
+        # 各列 [起, 止)：空白/非空白交替处即为各列的起止（末尾补的换行保证最后一列有止点）
+        buf = self.buf
+        solid = (buf > 32) | (buf < 9) | ((buf > 13) & (buf < 32))  # bytes.split() 的空白为 9–13 与 32
+        edges = np.flatnonzero(solid[1:] != solid[:-1]) + 1
+        if solid[0]:
+            edges = np.concatenate(([0], edges))
+        tok_starts = edges[0::2]
+        tok_stops = edges[1::2]
+        tok_lines = np.searchsorted(stops, tok_starts, side='right')
+
+        counts = np.bincount(tok_lines, minlength=self.line_count)[:self.line_count]
+        regular = counts == fields
+        if limit is not None:
+            regular[limit:] = False
+        self.regular = regular
+        idx = (np.cumsum(counts) - counts)[regular][:, None] + np.arange(fields)
+        self.starts = tok_starts[idx]
+        self.stops = tok_stops[idx]
+
+    def lengths(self, col):
+        return self.stops[:, col] - self.starts[:, col]
+
+    def _gather(self, starts, stops, extra=0):
+        # 把各段 [起, 止+extra) 的字节首尾相接取出，返回 (字节, 各段在其中的起点, 各段长度)
+        sizes = stops - starts + extra
+        offsets = np.cumsum(sizes) - sizes
+        return self.buf[np.repeat(starts - offsets, sizes) + np.arange(sizes.sum())], offsets, sizes
+
+    def _every(self, col, table):
+        # 第 col 列是否每个字节都满足 table（各列至少一个字节）
+        if not len(self.starts):
+            return np.zeros(0, dtype=bool)
+        picked, offsets, _ = self._gather(self.starts[:, col], self.stops[:, col])
+        return np.minimum.reduceat(table[picked], offsets)
+
+    def ascii(self, col):
+        return self._every(col, ASCII)
+
+    def digits(self, col):
+        return self._every(col, DIGITS)
+
+    def integers(self, col, width=MAX_AMOUNT_DIGITS):
+        # 把第 col 列（须为不超过 width 位的纯数字）按整列转为 int64；其他行的值无意义
+        pos = self.stops[:, col, None] - width + np.arange(width)
+        inside = pos >= self.starts[:, col, None]
+        values = np.where(inside, self.buf[np.maximum(pos, 0)].astype(np.int64) - 0x30, 0)
+        return values @ (10 ** np.arange(width - 1, -1, -1, dtype=np.int64))
+
+    def column(self, starts, stops, enc, errors):
+        # 按起止位置整列取出并一次解码，返回 str 列表
+        if not len(starts):
+            return []
+        picked, offsets, sizes = self._gather(starts, stops, 1)  # 每段带上其后的一个空白字节，改作分隔符
+        picked[offsets + sizes - 1] = 10
+        return picked.tobytes().decode(enc, errors).split('\n')[:-1]
+
+    def field(self, col, enc, errors):
+        return self.column(self.starts[:, col], self.stops[:, col], enc, errors)
+
+    def keep(self, mask):
+        # 规整行中再剔除 mask 为 False 的行（交回逐行解析）
+        self.regular[np.flatnonzero(self.regular)[~mask]] = False
+        self.starts = self.starts[mask]
+        self.stops = self.stops[mask]
+
+
+def _suffix(tok, col, n, default, enc, errors):
+    # 第 col 列的后 n 个字符（该列须为 ASCII），不足 n 个字符的取 default
+    starts = np.maximum(tok.starts[:, col], tok.stops[:, col] - n)
+    values = tok.column(starts, tok.stops[:, col], enc, errors)
+    for i in np.flatnonzero(tok.lengths(col) < n).tolist():
+        values[i] = default
+    return values
+
+
+def _amounts(cents, scale=YUAN):
+    # 整列按金额单位格式化（同 format_units，金额均非负），默认为两位小数的元：各位数字整列算出，
+    # 每行去掉整数部分的前导零后首尾相接，一次解码再切开
+    if not len(cents):
+        return []
+    decimals = AMOUNT_DECIMALS[scale]
+    width = MAX_AMOUNT_DIGITS - decimals  # 整数部分的最大位数
+    units, frac = cents // scale, cents % scale
+    text = np.empty((len(cents), width + (decimals + 1 if decimals else 0) + 1), dtype=np.uint8)
+    text[:, :width] = units[:, None] // 10 ** np.arange(width - 1, -1, -1, dtype=np.int64) % 10 + 0x30
+    if decimals:
+        text[:, width] = ord('.')
+        text[:, width + 1:-1] = frac[:, None] // 10 ** np.arange(decimals - 1, -1, -1, dtype=np.int64) % 10 + 0x30
+    text[:, -1] = 10
+    digits = (units[:, None] >= 10 ** np.arange(1, width, dtype=np.int64)).sum(axis=1) + 1
+    keep = np.arange(text.shape[1]) >= (width - digits)[:, None]
+    return text[keep].tobytes().decode('ascii').split('\n')[:-1]
+
+
+def _marked(tok, mark, enc):
+    # 含 mark 字样的行（他行报盘的汇总行等）
+    marked = np.zeros(tok.line_count, dtype=bool)
+    mark = mark.encode(fragment_codec(enc), errors='ignore') if mark else b''
+    pos = tok.data.find(mark) if mark else -1
+    while pos != -1:
+        marked[np.searchsorted(tok.line_stops, pos, side='right')] = True
+        pos = tok.data.find(mark, pos + len(mark))
+    return marked
+
+
+def _layout_rows(tok, layout, enc, errors):
+    # 按布局 layout 整列取出报盘 Excel 的各列，返回 (各列, 金额整数分)
+    #   · 须为纯数字的列（对应正则的 \d+）不满足时交回逐行解析
+    #   · 按字符取后缀的列须为 ASCII（字节数即字符数）
+    #   · 金额：strict_amount 时须为纯数字；否则不是纯数字时按 0 计（与逐行解析一致），过长的交回逐行解析
+    col = layout.amount_col
+    keep = np.ones(len(tok.starts), dtype=bool)
+    for i in layout.digit_cols:
+        keep &= tok.digits(i)
+    for spec in layout.columns:
+        if spec[0] == 'suffix':
+            keep &= tok.ascii(spec[1])
+    if layout.skip_mark:
+        keep &= ~_marked(tok, layout.skip_mark, enc)[tok.regular]
+    amount_len = tok.lengths(col)
+    if layout.strict_amount:
+        keep &= tok.digits(col) & (amount_len <= MAX_AMOUNT_DIGITS)
+    else:
+        keep &= ~(tok.digits(col) & (amount_len > MAX_AMOUNT_DIGITS))
+    tok.keep(keep)
+    cents = tok.integers(col) if layout.strict_amount else np.where(tok.digits(col), tok.integers(col), 0)
+
+    columns = []
+    for spec in layout.columns:
+        kind = spec[0]
+        if kind in ('field', 'or'):
+            columns.append(tok.field(spec[1], enc, errors))  # 切分出的列不会为空，'or' 的默认值用不到
+        elif kind == 'suffix':
+            columns.append(_suffix(tok, *spec[1:], enc, errors))
+        elif kind == 'amount':
+            columns.append(_amounts(cents, layout.amount_scale))
+        else:
+            columns.append(itertools.repeat(spec[1]))
+    return columns, cents
+
+
+def _suspects(tok, layout, enc, cents):
+    # 规整行中可能违反银行字段限制的行（validate），只对这些行逐行校验；其余行整列判断即可确定没有问题
+    #   · GBK 文件中字段的字节数就是按银行编码计的字节数；其他编码只有纯 ASCII 的字段能直接比较
+    #   · 无法解码而被忽略的字节只会让字节数偏大，多挑出的行逐行校验时自会排除
+    txt_col = {role: col for role, _, col, _ in layout.key}
+    same_bytes = codecs.lookup(enc).name in ('gbk', 'gb2312', 'ascii')
+    suspect = cents >= validate.AMOUNT_LIMIT_CENTS
+    for role, limit in (('name', validate.NAME_MAX_BYTES), ('remark', validate.REMARK_MAX_BYTES)):
+        col = txt_col[role]
+        suspect |= tok.lengths(col) > limit
+        if not same_bytes:
+            suspect |= ~tok.ascii(col)
+    col = txt_col['card']
+    card_len = tok.lengths(col)
+    suspect |= ~tok.digits(col) | (card_len < validate.CARD_MIN_DIGITS) | (card_len > validate.CARD_MAX_DIGITS)
+    return suspect
+
+
+def offer_block_rows(layout, data, enc, errors, scalar, total=None, first_line=1, drop_last=False, check=None):
+    # 解析一块完整的行（bytes），按原顺序返回写入 Excel 的行（列表）；各列的位置与取法见 layout
+    # scalar(numbered) 逐行解析不规整的行：numbered 为 (行号, 行)，返回 (行号, 行) 的列表（如 layout.numbered_offer_rows）
+    # drop_last 时去掉块中最后一行（本行报盘的汇总行）
+    # total（CentsTotal）不为空时累加规整行的笔数与金额（不规整的行由 scalar 自行累加）
+    # check 不为空时对规整行调用 check(行号, 行) 做字段校验（不规整的行由 scalar 自行校验），行号按文件中的顺序
+    limit = data.count(b'\n') + (not data.endswith(b'\n') if data else 0)
+    if drop_last and limit:
+        limit -= 1
+    tok = _Tokens(data, layout.fields, limit)
+    columns, cents = _layout_rows(tok, layout, enc, errors)
+    if total is not None:
+        total.count += len(cents)
+        total.cents += sum(int(part.sum()) for part in np.array_split(cents, max(1, len(cents) // 1_000_000)))
+
+    regular = list(zip(*columns))
+    if check is not None and regular:
+        line_nums = np.flatnonzero(tok.regular) + first_line
+        for i in np.flatnonzero(_suspects(tok, layout, enc, cents)).tolist():
+            check(int(line_nums[i]), regular[i])
+    irregular = np.flatnonzero(~tok.regular[:limit])
+    if not len(irregular):
+        return regular
+    # 不规整的行一次取出、解码后交给逐行解析，结果按行号插回规整行之间
+    starts, stops = tok.line_starts[irregular].tolist(), tok.line_stops[irregular].tolist()
+    text = b''.join([data[start:stop] for start, stop in zip(starts, stops)]).decode(enc, errors)
+    parsed = scalar(zip((irregular + first_line).tolist(), text.split('\n')))
+    if not parsed:
+        return regular
+    # 每个解析出的行之前的规整行数 = 行在块中的序号 - 它之前的不规整行数
+    at = np.array([line_num for line_num, _ in parsed]) - first_line
+    before = (at - np.searchsorted(irregular, at)).tolist()
+    rows = []
+    taken = 0
+    for (_, row), count in zip(parsed, before):
+        rows += regular[taken:count]
+        rows.append(row)
+        taken = count
+    rows += regular[taken:]
+    return rows
@@ -0,0 +1,159 @@
+import os
+import csv
+import time
+import signal
+import datetime
+import threading
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import SUMMARY_FIELDS, discover, run_task
+from report import report_path
+
+# 监控模式：常驻运行，定时扫描收件目录，新到的 本行报盘.txt / 他行报盘.txt / 回盘.xls(x) 写完后自动转换，
+# 输出与差异报告放到发件目录（按文件名前缀分子目录，与批量处理一致），每个文件的结果追加到处理记录表
+#   · 防抖：文件大小与修改时间连续 settle 秒不变、且能打开读取，才视为写完
+#   · 回盘 xls 要等同前缀的报盘 txt 也到齐才处理
+#   · 同时执行的任务不超过 workers 个，其余留到下一轮提交
+#   · 输入文件改动（大小或修改时间变化）后重新处理；重启后跳过输出已比输入新的任务
+
+WATCH_LOG_NAME = '监控处理记录.csv'
+WATCH_LOG_FIELDS = ['时间'] + SUMMARY_FIELDS
+DEFAULT_INTERVAL = 1.0  # 扫描间隔（秒）
+DEFAULT_SETTLE = 2.0    # 文件多久没有变化才算写完（秒）
+
+
+def _signature(path):
+    st = os.stat(path)
+    return str(path), st.st_size, st.st_mtime_ns
+
+
+def _readable(path):
+    # 其他程序仍以独占方式写入时（Windows 常见）打不开
+    try:
+        with open(path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+
+def _ignore_sigint():
+    # 子进程不响应 Ctrl+C，由监控进程统一收尾（等待已提交的任务完成）
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _up_to_date(task):
+    # 输出（一致时的回盘/报盘文件，或不一致时的差异报告）比所有输入都新，说明之前已处理过
+    inputs = [p for p in (task.txt_path, task.xls_path) if p is not None]
+    newest = max(os.stat(p).st_mtime_ns for p in inputs)
+    for out in (task.out_path, report_path(task.out_path)):
+        try:
+            if os.stat(out).st_mtime_ns >= newest:
+                return True
+        except OSError:
+            pass
+    return False
+
+
+class Watcher:
+    def __init__(self, inbox, outbox=None, workers=None, interval=DEFAULT_INTERVAL, settle=DEFAULT_SETTLE,
+                 on_result=None):
+        self.inbox = Path(inbox)
+        self.outbox = Path(outbox) if outbox else self.inbox / '监控结果'
+        self.workers = workers or os.cpu_count() or 1
+        self.interval = interval
+        self.settle = settle
+        self.on_result = on_result  # on_result(row)，每个任务完成后在监控线程中调用
+        self.processed = 0
+        self._seen = {}      # 路径 → (大小, 修改时间, 首次看到该状态的时刻)
+        self._done = set()   # 已处理（或已提交）的 (类型, 输入签名…)
+        self._running = {}   # future → 任务
+        self._waiting = set()
+        self._pool = None
+
+    # -------------------- 防抖 --------------------
+    def _stable(self, path, now):
+        try:
+            _, size, mtime = _signature(path)
+        except OSError:
+            self._seen.pop(path, None)
+            return False
+        state = self._seen.get(path)
+        if state is None or state[:2] != (size, mtime):
+            self._seen[path] = (size, mtime, now)
+            return False
+        return now - state[2] >= self.settle and _readable(path)
+
+    # -------------------- 一轮扫描 --------------------
+    def poll(self):
+        now = time.monotonic()
+        self._collect()
+        for task in discover(self.inbox, self.outbox):
+            if task.txt_path is None:
+                # 回盘先到：等报盘 txt，只提示一次
+                if task.xls_path not in self._waiting:
+                    self._waiting.add(task.xls_path)
+                    print('等待对应的报盘txt：', task.xls_path)
+                continue
+            inputs = [p for p in (task.txt_path, task.xls_path) if p is not None]
+            if not all(self._stable(p, now) for p in inputs):
+                continue
+            try:
+                # 带上扫描时的失败原因：删去重复的回盘后，同一份回盘按正常任务重新转换
+                key = (task.kind, task.error) + tuple(_signature(p) for p in inputs)
+            except OSError:
+                continue
+            if key in self._done:
+                continue
+            if len(self._running) >= self.workers:
+                break  # 池满，剩下的下一轮再提交
+            self._done.add(key)
+            self._waiting.discard(task.xls_path)
+            if _up_to_date(task):
+                continue
+            self._running[self._pool.submit(run_task, task)] = task
+
+    def _collect(self):
+        for future in [f for f in self._running if f.done()]:
+            task = self._running.pop(future)
+            try:
+                row = future.result()
+            except Exception as e:  # 子进程异常退出等
+                row = {'类型': task.kind, '报盘文件': str(task.txt_path or ''),
+                       '回盘文件': str(task.xls_path or ''), '输出文件': '', '结果': '失败',
+                       '说明': str(e), '用时(秒)': '', '阶段耗时': ''}
+            self._record(row)
+
+    def _record(self, row):
+        self.processed += 1
+        row = {'时间': datetime.datetime.now().isoformat(timespec='seconds'), **row}
+        self.outbox.mkdir(parents=True, exist_ok=True)
+        log_path = self.outbox / WATCH_LOG_NAME
+        new = not log_path.exists()
+        with open(log_path, 'a', encoding='utf-8-sig' if new else 'utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=WATCH_LOG_FIELDS)
+            if new:
+                writer.writeheader()
+            writer.writerow(row)
+        if self.on_result is not None:
+            self.on_result(row)
+
+    # -------------------- 常驻运行 --------------------
+    def run(self, stop=None):
+        # 运行到 stop（threading.Event）被置位或 Ctrl+C；退出前等待已提交的任务完成并记录
+        if not self.inbox.is_dir():
+            raise Exception(f'收件目录不存在：\n{self.inbox}')
+        stop = stop or threading.Event()
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_sigint)
+        print('开始监控：', self.inbox, '→', self.outbox)
+        try:
+            while not stop.is_set():
+                self.poll()
+                stop.wait(self.interval)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._collect()
+            print('监控结束，共处理', self.processed, '个文件')
+        return self.processed
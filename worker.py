@@ -0,0 +1,113 @@
+import time
+import queue
+import threading
+
+
+# 作业被取消：继承 BaseException，避免被转换函数里宽泛的 except Exception 吞掉
+class JobCancelled(BaseException):
+    pass
+
+
+class Job:
+    QUEUED, RUNNING, DONE, FAILED, CANCELLED = '排队中', '处理中', '完成', '失败', '已取消'
+
+    def __init__(self, func, name=''):
+        self.func = func  # func(progress) → 结果
+        self.name = name
+        self.state = Job.QUEUED
+        self.result = None
+        self.error = None
+        self.rows = 0     # 已处理行数
+        self.done = 0     # 已读字节
+        self.total = 0    # 总字节
+        self.started = None
+        self.finished = None
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    # 传给 utils 转换函数的进度回调，在工作线程中调用
+    def progress(self, rows, done, total):
+        if self._cancel.is_set():
+            raise JobCancelled()
+        self.rows, self.done, self.total = rows, done, total
+
+    def fraction(self):
+        return self.done / self.total if self.total else 0.0
+
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.perf_counter()) - self.started
+
+    def rows_per_sec(self):
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        # 按已读字节比例估算剩余秒数，尚无进度时返回 None
+        if not self.done or not self.total:
+            return None
+        return self.elapsed() * (self.total - self.done) / self.done
+
+    def run(self):
+        if self._cancel.is_set():
+            self.state = Job.CANCELLED
+            return
+        self.state = Job.RUNNING
+        self.started = time.perf_counter()
+        try:
+            self.result = self.func(self.progress)
+            self.state = Job.DONE
+        except JobCancelled:
+            self.state = Job.CANCELLED
+        except Exception as e:
+            self.error = e
+            self.state = Job.FAILED
+        finally:
+            self.finished = time.perf_counter()
+
+    @property
+    def is_final(self):
+        return self.state in (Job.DONE, Job.FAILED, Job.CANCELLED)
+
+
+class JobQueue:
+    # 单个后台线程按提交顺序执行作业，各页面提交的作业排队而不互相阻塞界面
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, func, name=''):
+        job = Job(func, name)
+        with self._lock:
+            self._pending.append(job)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='JobQueue', daemon=True)
+                self._thread.start()
+        self._queue.put(job)
+        return job
+
+    def position(self, job):
+        # 作业前面还有几个未完成的作业
+        with self._lock:
+            try:
+                return self._pending.index(job)
+            except ValueError:
+                return 0
+
+    def _loop(self):
+        while True:
+            job = self._queue.get()
+            try:
+                job.run()
+            finally:
+                with self._lock:
+                    self._pending.remove(job)